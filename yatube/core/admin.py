@@ -0,0 +1,145 @@
+"""Админка для больших таблиц.
+
+Стандартный changelist на каждой странице делает COUNT(*) по всей
+таблице (и еще один для «всего N»), листает OFFSET'ом по широким
+строкам, а выпадающие списки внешних ключей читает заново для каждой
+строки list_editable. ScalableAdminMixin заменяет это на точный
+подсчет только до ADMIN_EXACT_COUNT_LIMIT строк с оценкой выше,
+отложенную выборку строк страницы и общие на запрос варианты выбора.
+Страницы по-прежнему листаются OFFSET'ом (см. EstimatedCountPaginator).
+"""
+from django import forms
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_rows(model, using):
+    """Примерное число строк таблицы без COUNT(*); None, если оценки нет."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [table],
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                # Первое число stat - строк в индексе, то есть в таблице.
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+                    [table],
+                )
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            # Без ANALYZE: наибольший rowid, поиск по первичному ключу.
+            cursor.execute(
+                f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}"
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает всю таблицу.
+
+    Строки считаются точно, пока их не больше ADMIN_EXACT_COUNT_LIMIT.
+    Дальше для таблицы без фильтров берется оценка СУБД, а для
+    отфильтрованного списка - «больше порога». Страница сначала
+    выбирает только первичные ключи (узкое чтение по индексу
+    сортировки), и лишь затем - сами строки.
+
+    Ограничение: это по-прежнему OFFSET, а не keyset. Changelist
+    адресует страницы номером (?p=N) и разрешает переход на любую,
+    поэтому границы предыдущей страницы неизвестны, и глубокая
+    страница пропускает все строки до нее - хоть и только по индексу,
+    без чтения самих строк. Для глубокого просмотра нужны фильтры,
+    дата-иерархия или поиск, а не номер страницы.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        exact = queryset.order_by()[:limit + 1].count()
+        if exact <= limit or queryset.query.where:
+            return exact
+        estimate = estimated_rows(queryset.model, queryset.db)
+        return max(estimate or 0, exact)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        ids = list(self.object_list.values_list("pk", flat=True)[
+            bottom:bottom + self.per_page
+        ])
+        return self._get_page(
+            self.object_list.filter(pk__in=ids), number, self
+        )
+
+
+class SharedChoices:
+    """Варианты выбора, прочитанные один раз на все копии поля."""
+
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.rows = None
+
+    def _load(self):
+        if self.rows is None:
+            self.rows = list(self.iterator)
+        return self.rows
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __copy__(self):
+        # Виджет копирует choices вместе с собой; копии должны делить
+        # один прочитанный список.
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class SharedChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField, копии которого делят один SELECT вариантов.
+
+    Формы list_editable получают глубокие копии поля класса формы;
+    обычный ModelChoiceField читает варианты в каждой из них.
+    """
+
+    def _get_choices(self):
+        shared = self.__dict__.get("shared_choices")
+        if shared is None:
+            shared = self.shared_choices = SharedChoices(
+                super()._get_choices()
+            )
+        return shared
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+
+class ScalableAdminMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Дата-иерархия из запросов по индексу даты (core.templatetags).
+    change_list_template = "admin/indexed_change_list.html"
+    # Внешние ключи на маленькие таблицы, оставленные выпадающими.
+    shared_choice_fields = ()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.shared_choice_fields:
+            kwargs.setdefault("form_class", SharedChoiceField)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        from .auth import invalidate_user
+        from .sqlite import apply_pragmas
+
+        connection_created.connect(
+            apply_pragmas, dispatch_uid="core.sqlite.apply_pragmas"
+        )
+        for name, signal in (("save", post_save), ("delete", post_delete)):
+            signal.connect(
+                invalidate_user,
+                sender=settings.AUTH_USER_MODEL,
+                dispatch_uid=f"core.auth.invalidate_user.{name}",
+            )
@@ -0,0 +1,131 @@
+"""Пользователь запроса без лишних чтений django_session и auth_user.
+
+Стандартные AuthenticationMiddleware и ModelBackend на каждый
+запрос вошедшего пользователя читают его строку auth_user, а у
+анонимного все равно обращаются к сессии, из-за чего ответ получает
+Vary: Cookie. Здесь пользователь берется из общего для процессов
+кеша AUTH_USER_CACHE_ALIAS (его сбрасывают сигналы сохранения и
+удаления User), а запрос без cookie сессии сразу получает
+AnonymousUser и сессию не трогает вовсе. Без общего кеша пользователь
+не кешируется: сброс в LocMemCache одного процесса не дошел бы до
+остальных, и смена пароля не разлогинила бы в них пользователя.
+
+В кеш (он лежит на диске, cache/shared.sqlite3) попадают поля
+пользователя без хеша пароля - вместо него хранится производный от
+него хеш сессии. Сотрудники и суперпользователи не кешируются вовсе.
+Сессии, созданные до перехода на CachedModelBackend, хранят путь
+стандартного ModelBackend; middleware переписывает его, а не
+разлогинивает пользователя.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+USER_KEY = "auth-user:{}"
+LEGACY_BACKEND = "django.contrib.auth.backends.ModelBackend"
+
+
+def _user_cache():
+    alias = settings.AUTH_USER_CACHE_ALIAS
+    if alias is None or not settings.AUTH_USER_CACHE_TIMEOUT:
+        return None
+    return caches[alias]
+
+
+def _cached_fields(model):
+    return [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname != "password"
+    ]
+
+
+def _to_cache(user):
+    fields = _cached_fields(type(user))
+    return {
+        "values": [getattr(user, name) for name in fields],
+        "session_hash": user.get_session_auth_hash(),
+    }
+
+
+def _from_cache(model, data):
+    """Пользователь из кеша; пароль - отложенное поле.
+
+    check_password() и set_password() дочитают его из базы, а
+    save() без него пароль не перезапишет. Хеш сессии берется из кеша,
+    пока пароль не загружен и не изменен.
+    """
+    user = model.from_db(
+        DEFAULT_DB_ALIAS, _cached_fields(model), data["values"]
+    )
+    real_hash = user.get_session_auth_hash
+
+    def get_session_auth_hash():
+        if "password" in user.__dict__:
+            return real_hash()
+        return data["session_hash"]
+
+    user.get_session_auth_hash = get_session_auth_hash
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который читает пользователя сессии из кеша.
+
+    При промахе строка читается из основной базы: отстающая реплика
+    не должна вернуть в кеш старый пароль или is_active.
+    """
+
+    def get_user(self, user_id):
+        cache = _user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        model = get_user_model()
+        key = USER_KEY.format(user_id)
+        data = cache.get(key)
+        if data is not None:
+            user = _from_cache(model, data)
+        else:
+            try:
+                user = model._default_manager.db_manager(
+                    DEFAULT_DB_ALIAS
+                ).get(pk=user_id)
+            except model.DoesNotExist:
+                return None
+            if not (user.is_staff or user.is_superuser):
+                cache.set(
+                    key, _to_cache(user), settings.AUTH_USER_CACHE_TIMEOUT
+                )
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(sender, instance, **kwargs):
+    cache = _user_cache()
+    if cache is not None:
+        cache.delete(USER_KEY.format(instance.pk))
+
+
+class SessionCookieAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, который без cookie сессии ее не читает.
+
+    Без cookie пользователь заведомо анонимный, поэтому сессия не
+    загружается и не помечается прочитанной: ответ не получает
+    Vary: Cookie и может кешироваться общими кешами.
+    """
+
+    def process_request(self, request):
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            request.user = AnonymousUser()
+            return None
+        if (
+            request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND
+            and LEGACY_BACKEND not in settings.AUTHENTICATION_BACKENDS
+        ):
+            request.session[BACKEND_SESSION_KEY] = (
+                settings.AUTHENTICATION_BACKENDS[0]
+            )
+        return super().process_request(request)
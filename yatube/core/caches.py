@@ -0,0 +1,327 @@
+"""Общий для процессов кеш и двухуровневый кеш перед ним.
+
+LocMemCache живет в памяти одного процесса: с каждым новым воркером
+доля попаданий падает, а сдвиг версии ленты в одном процессе не
+виден остальным. SQLiteCache хранит ключи в одном файле SQLite,
+который делят все процессы машины; get_many и set_many - это один
+SELECT ... IN и одна транзакция, incr атомарен. TwoLevelCache держит
+перед общим кешем (L2, любой алиас CACHES, хоть memcached) небольшой
+кеш процесса (L1) с коротким TTL: горячие ключи, например версии
+лент, не ходят в L2 на каждый запрос, а чужие изменения видны не
+позже чем через L1_TIMEOUT секунд.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends import locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .timing import TimedCacheMixin, current
+
+_MISSING = object()
+# Столько переменных SQLite допускает в одном запросе и в старых сборках.
+_BATCH = 500
+
+
+class BaseSQLiteCache(BaseCache):
+    """Кеш в таблице файла SQLite, общей для всех процессов."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        options = params.get("OPTIONS", {})
+        # Раз в столько записей процесс удаляет истекшие ключи и,
+        # если их больше MAX_ENTRIES, каждый CULL_FREQUENCY-й.
+        self._cull_every = int(options.get("CULL_EVERY", 100))
+        self._writes = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение свое у каждого потока и не переживает fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=5, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection()
+        # IMMEDIATE сразу берет блокировку записи: чтение и запись
+        # внутри транзакции не перемежаются с другими процессами.
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute(
+            "DELETE FROM cache WHERE expires <= ?", (time.time(),)
+        )
+        count, = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY expires IS NULL, expires LIMIT ?)",
+                (count // self._cull_frequency,),
+            )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dumps(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _live(self, connection, key):
+        return connection.execute(
+            "SELECT value FROM cache WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+
+    def get(self, key, default=None, version=None):
+        row = self._live(self._connection(), self._key(key, version))
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        connection = self._connection()
+        now = time.time()
+        made = list(keys)
+        found = {}
+        for start in range(0, len(made), _BATCH):
+            batch = made[start:start + _BATCH]
+            rows = connection.execute(
+                "SELECT key, value FROM cache WHERE key IN "
+                f"({', '.join('?' * len(batch))}) "
+                "AND (expires IS NULL OR expires > ?)",
+                (*batch, now),
+            )
+            for key, value in rows:
+                found[keys[key]] = pickle.loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version), self._dumps(value), expires)
+            for key, value in data.items()
+        ]
+        with self._write() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            if self._live(connection, key) is not None:
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                (key, self._dumps(value), self.get_backend_timeout(timeout)),
+            )
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        made = self._key(key, version)
+        with self._write() as connection:
+            row = self._live(connection, made)
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                "UPDATE cache SET value = ? WHERE key = ?",
+                (self._dumps(value), made),
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as connection:
+            updated = connection.execute(
+                "UPDATE cache SET expires = ? WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (
+                    self.get_backend_timeout(timeout),
+                    self._key(key, version),
+                    time.time(),
+                ),
+            ).rowcount
+        return bool(updated)
+
+    def has_key(self, key, version=None):
+        return self._live(
+            self._connection(), self._key(key, version)
+        ) is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made = [self._key(key, version) for key in keys]
+        with self._write() as connection:
+            for start in range(0, len(made), _BATCH):
+                batch = made[start:start + _BATCH]
+                connection.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    f"({', '.join('?' * len(batch))})",
+                    batch,
+                )
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute("DELETE FROM cache")
+
+
+class SQLiteCache(TimedCacheMixin, BaseSQLiteCache):
+    pass
+
+
+@contextmanager
+def _uncounted():
+    # Попадания и промахи считает внешний TwoLevelCache, а не L2.
+    timing = current()
+    if timing is None:
+        yield
+    else:
+        with timing.cache_paused():
+            yield
+
+
+class BaseTwoLevelCache(BaseCache):
+    """L1 в памяти процесса с коротким TTL перед общим L2.
+
+    OPTIONS: L2 - алиас общего кеша в CACHES, L1_TIMEOUT - сколько
+    секунд процесс верит своей копии, L1_MAX_ENTRIES - размер L1.
+    Ключи и версии передаются обоим уровням как есть.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.l2_alias = options.get("L2", "shared")
+        self.l1_timeout = options.get("L1_TIMEOUT", 2)
+        self.l1 = locmem.LocMemCache(f"l1:{location}", {
+            "TIMEOUT": self.l1_timeout,
+            "OPTIONS": {"MAX_ENTRIES": options.get("L1_MAX_ENTRIES", 10000)},
+        })
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def _l1_timeout(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def get(self, key, default=None, version=None):
+        value = self.l1.get(key, _MISSING, version)
+        if value is _MISSING:
+            with _uncounted():
+                value = self.l2.get(key, _MISSING, version)
+            if value is _MISSING:
+                return default
+            self.l1.set(key, value, self.l1_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.l1.get_many(keys, version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            with _uncounted():
+                shared = self.l2.get_many(missing, version)
+            if shared:
+                self.l1.set_many(shared, self.l1_timeout, version)
+                found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version)
+        self.l1.set(key, value, self._l1_timeout(timeout), version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version)
+        self.l1.set_many(
+            {key: value for key, value in data.items() if key not in failed},
+            self._l1_timeout(timeout),
+            version,
+        )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version)
+        if added:
+            self.l1.set(key, value, self._l1_timeout(timeout), version)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version)
+        self.l1.set(key, value, self.l1_timeout, version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.delete(key, version)
+        return self.l2.touch(key, timeout, version)
+
+    def has_key(self, key, version=None):
+        if self.l1.has_key(key, version):
+            return True
+        with _uncounted():
+            return self.l2.has_key(key, version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(key, version)
+        self.l2.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l1.delete_many(keys, version)
+        self.l2.delete_many(keys, version)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+
+class TwoLevelCache(TimedCacheMixin, BaseTwoLevelCache):
+    pass
@@ -0,0 +1,108 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.http_bench import QueryCounter, percentile
+from posts.models import User
+
+LEGACY_MIDDLEWARE = [
+    (
+        "django.contrib.auth.middleware.AuthenticationMiddleware"
+        if name == "core.auth.SessionCookieAuthenticationMiddleware"
+        else name
+    )
+    for name in settings.MIDDLEWARE
+]
+PROFILES = {
+    # Как было: сессия в django_session, пользователь из auth_user
+    # на каждый запрос.
+    "legacy": {
+        "SESSION_ENGINE": settings.SESSION_ENGINES["db"],
+        "AUTH_USER_CACHE_ALIAS": None,
+        "MIDDLEWARE": LEGACY_MIDDLEWARE,
+    },
+    # Замер идет в одном процессе, поэтому без общего кеша его роль
+    # играет default; в проекте так настраивать нельзя (settings.py).
+    **{
+        mode: {
+            "SESSION_ENGINE": engine,
+            "SESSION_CACHE_ALIAS": settings.SHARED_CACHE_ALIAS or "default",
+            "AUTH_USER_CACHE_ALIAS": (
+                settings.SHARED_CACHE_ALIAS or "default"
+            ),
+        }
+        for mode, engine in settings.SESSION_ENGINES.items()
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет, сколько времени и SQL-запросов добавляют сессия и "
+        "загрузка пользователя к запросу, в каждом режиме SESSION_MODE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=500,
+            help="Сколько запросов на каждый профиль.",
+        )
+        parser.add_argument(
+            "--path",
+            default=reverse("about:author"),
+            help="Страница для замера; лучше легкая, без своих запросов.",
+        )
+        parser.add_argument(
+            "--profile",
+            choices=sorted(PROFILES),
+            action="append",
+            help="По умолчанию все.",
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_active=True).order_by("pk").first()
+        if user is None:
+            raise CommandError("В базе нет пользователей")
+        anonymous, _ = self.measure(Client(), options)
+        self.stdout.write(
+            f"{'anonymous':14} p50 {percentile(anonymous, 50):7.3f} мс  "
+            f"p95 {percentile(anonymous, 95):7.3f} мс"
+        )
+        baseline = percentile(anonymous, 50)
+        for profile in options["profile"] or PROFILES:
+            with override_settings(**PROFILES[profile]):
+                # Клиент собирает MIDDLEWARE при первом запросе, то есть
+                # уже с настройками профиля.
+                client = Client()
+                client.force_login(user)
+                timings, queries = self.measure(client, options)
+            p50 = percentile(timings, 50)
+            self.stdout.write(
+                f"{profile:14} p50 {p50:7.3f} мс  "
+                f"p95 {percentile(timings, 95):7.3f} мс  "
+                f"сессия +{p50 - baseline:6.3f} мс  "
+                f"запросов {sum(queries) / len(queries):4.2f}"
+            )
+
+    def measure(self, client, options):
+        for _ in range(min(options["repeat"], 10)):
+            client.get(options["path"])
+        timings, queries = [], []
+        for _ in range(options["repeat"]):
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = client.get(options["path"])
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+            if response.status_code != 200:
+                raise CommandError(
+                    f"{options['path']}: статус {response.status_code}"
+                )
+        return timings, queries
@@ -0,0 +1,146 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from posts.http_bench import percentile
+from posts.models import Comment, Post, User
+
+# По этой метке находятся и удаляются записи бенчмарка.
+MARK = "bench_sqlite"
+PROFILES = {
+    # Как было: прагмы SQLite по умолчанию и новое соединение
+    # на каждый запрос (CONN_MAX_AGE = 0).
+    "default": ({"journal_mode": "DELETE", "synchronous": "FULL"}, False),
+    "tuned": (None, True),
+}
+
+
+def _read():
+    list(Post.objects.select_related("author", "group")[:10])
+
+
+def _write(rnd, post_ids, user_ids):
+    if rnd.random() < 0.5:
+        Comment.objects.create(
+            post_id=rnd.choice(post_ids),
+            author_id=rnd.choice(user_ids),
+            text=f"{MARK} комментарий",
+        )
+    else:
+        Post.objects.create(
+            author_id=rnd.choice(user_ids), text=f"{MARK} пост"
+        )
+
+
+def worker(args):
+    """Один процесс: смесь чтений и записей в течение duration секунд."""
+    number, profile, duration, write_ratio, post_ids, user_ids = args
+    pragmas, persistent = PROFILES[profile]
+    settings.SQLITE_PRAGMAS = pragmas or settings.SQLITE_PRAGMAS
+    rnd = random.Random(number)
+    timings = {"read": [], "write": []}
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        kind = "write" if rnd.random() < write_ratio else "read"
+        started = time.perf_counter()
+        try:
+            if kind == "read":
+                _read()
+            else:
+                _write(rnd, post_ids, user_ids)
+        except OperationalError:
+            # «database is locked» после истечения busy_timeout.
+            errors += 1
+            continue
+        finally:
+            if not persistent:
+                connection.close()
+        timings[kind].append((time.perf_counter() - started) * 1000)
+    connection.close()
+    return timings, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает SQLite смесью чтений и записей из нескольких "
+        "процессов и сравнивает прагмы по умолчанию с SQLITE_PRAGMAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10,
+            help="Секунд на каждый профиль.",
+        )
+        parser.add_argument(
+            "--write-ratio",
+            type=float,
+            default=0.1,
+            help="Доля записей среди операций.",
+        )
+        parser.add_argument(
+            "--profile",
+            choices=sorted(PROFILES),
+            action="append",
+            help="default и/или tuned; по умолчанию оба.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Бенчмарк только для SQLite")
+        post_ids = list(Post.objects.values_list("pk", flat=True)[:1000])
+        user_ids = list(User.objects.values_list("pk", flat=True)[:1000])
+        if not post_ids:
+            raise CommandError("База пуста: сначала запустите seed_yatube")
+        try:
+            for profile in options["profile"] or ("default", "tuned"):
+                self.run(profile, options, post_ids, user_ids)
+        finally:
+            self.cleanup()
+
+    def run(self, profile, options, post_ids, user_ids):
+        journal_mode = (PROFILES[profile][0] or settings.SQLITE_PRAGMAS)[
+            "journal_mode"
+        ]
+        with connection.cursor() as cursor:
+            # Режим журнала хранится в файле базы, а не в соединении.
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        # Дочерние процессы не должны унаследовать открытое соединение.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(options["processes"]) as pool:
+            results = pool.map(worker, [
+                (
+                    number, profile, options["duration"],
+                    options["write_ratio"], post_ids, user_ids,
+                )
+                for number in range(options["processes"])
+            ])
+        self.report(profile, options["duration"], results)
+
+    def report(self, profile, duration, results):
+        errors = sum(count for _, count in results)
+        self.stdout.write(f"{profile}: ошибок блокировки {errors}")
+        for kind in ("read", "write"):
+            timings = [ms for result, _ in results for ms in result[kind]]
+            if not timings:
+                continue
+            self.stdout.write(
+                f"  {kind:5} {len(timings) / duration:8.1f} оп/с  "
+                f"p50 {percentile(timings, 50):7.2f} мс  "
+                f"p95 {percentile(timings, 95):7.2f} мс  "
+                f"p99 {percentile(timings, 99):7.2f} мс"
+            )
+
+    def cleanup(self):
+        for comment in Comment.objects.filter(text__startswith=MARK):
+            comment.delete()
+        for post in Post.objects.filter(text__startswith=MARK):
+            post.delete()
@@ -0,0 +1,83 @@
+import glob
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.querystats import load
+
+# Список колонок занимает всю ширину и ничего не говорит о запросе.
+SELECT_LIST = re.compile(r"^SELECT (DISTINCT )?.+? FROM ")
+SORT_KEYS = {
+    "total": lambda stats: stats.total_ms,
+    "count": lambda stats: stats.count,
+    "p95": lambda stats: stats.p95_ms,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает самые дорогие SQL-запросы по отпечаткам из файлов, "
+        "собранных в режиме QUERYSTATS_ENABLED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files",
+            nargs="*",
+            help="Файлы статистики; по умолчанию QUERYSTATS_FILE "
+                 "вместе с ротированными копиями.",
+        )
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument(
+            "--sort", choices=sorted(SORT_KEYS), default="total"
+        )
+        parser.add_argument(
+            "--merge-views",
+            action="store_true",
+            help="Сводить одинаковые запросы разных view вместе.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Не сокращать список колонок в SELECT.",
+        )
+        parser.add_argument(
+            "--width",
+            type=int,
+            default=120,
+            help="Сколько символов отпечатка показывать.",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["files"] or sorted(
+            glob.glob(f"{settings.QUERYSTATS_FILE}*")
+        )
+        stats = load(
+            self.lines(paths), by_view=not options["merge_views"]
+        )
+        if not stats:
+            self.stdout.write("Статистики нет: включите QUERYSTATS_ENABLED")
+            return
+        ranked = sorted(
+            stats.items(),
+            key=lambda item: SORT_KEYS[options["sort"]](item[1]),
+            reverse=True,
+        )
+        self.stdout.write(
+            f"{'всего, мс':>12} {'запросов':>9} {'сред., мс':>10} "
+            f"{'p95, мс':>9}  view / запрос"
+        )
+        for (view, sql), item in ranked[:options["top"]]:
+            if not options["full"]:
+                sql = SELECT_LIST.sub(r"SELECT \1… FROM ", sql, count=1)
+            self.stdout.write(
+                f"{item.total_ms:12.1f} {item.count:9} "
+                f"{item.total_ms / item.count:10.2f} {item.p95_ms:9.2f}  "
+                f"{view}\n{'':44}{sql[:options['width']]}"
+            )
+
+    def lines(self, paths):
+        for path in paths:
+            with open(path, encoding="utf-8") as source:
+                yield from source
@@ -0,0 +1,55 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite во все реплики DATABASE_REPLICAS "
+        "(локальная замена репликации)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Повторять копирование каждые N секунд.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("Реплик нет: задайте YATUBE_REPLICAS")
+        while True:
+            started = time.perf_counter()
+            self.sync()
+            self.stdout.write(
+                f"Реплики обновлены за "
+                f"{(time.perf_counter() - started) * 1000:.0f} мс"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def sync(self):
+        primary = sqlite3.connect(
+            connections["default"].settings_dict["NAME"]
+        )
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                # Соединения с репликой в этом процессе закрываются,
+                # иначе они увидят файл в середине копирования.
+                connections[alias].close()
+                replica = sqlite3.connect(
+                    connections[alias].settings_dict["NAME"]
+                )
+                try:
+                    # backup() дает согласованный снимок даже в режиме WAL
+                    # и при одновременных записях в основную базу.
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+        finally:
+            primary.close()
@@ -0,0 +1,118 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import querystats, routers
+from . import timing as request_timing
+
+logger = logging.getLogger("yatube.requests")
+
+
+def _flags(timing, total_ms):
+    """Какие пороги SLOW_REQUEST_* превысил запрос."""
+    flags = []
+    if total_ms > settings.SLOW_REQUEST_MS:
+        flags.append("slow")
+    if timing.queries > settings.SLOW_REQUEST_QUERIES:
+        flags.append("many_queries")
+    if timing.query_ms > settings.SLOW_REQUEST_DB_MS:
+        flags.append("slow_db")
+    return flags
+
+
+def _server_timing(timing, total_ms):
+    return ", ".join((
+        f'db;dur={timing.query_ms:.1f};desc="{timing.queries} queries"',
+        f"tpl;dur={timing.template_ms:.1f}",
+        f'cache;desc="{timing.cache_hits} hits, '
+        f'{timing.cache_misses} misses"',
+        f"total;dur={total_ms:.1f}",
+    ))
+
+
+def _log_line(request, response, timing, total_ms, flags):
+    match = request.resolver_match
+    return json.dumps({
+        "method": request.method,
+        "path": request.path,
+        "view": match.view_name if match else None,
+        "status": response.status_code,
+        "total_ms": round(total_ms, 1),
+        "queries": timing.queries,
+        "db_ms": round(timing.query_ms, 1),
+        "template_ms": round(timing.template_ms, 1),
+        "cache_hits": timing.cache_hits,
+        "cache_misses": timing.cache_misses,
+        "flags": flags,
+    }, ensure_ascii=False)
+
+
+class ServerTimingMiddleware:
+    """Время, SQL-запросы, шаблоны и кеш каждого запроса.
+
+    Пишет строку JSON в лог yatube.requests (WARNING, если запрос
+    превысил пороги SLOW_REQUEST_*) и, если SERVER_TIMING_HEADER
+    включен, заголовок Server-Timing для инструментов браузера.
+    Стоит первым в MIDDLEWARE, чтобы учитывать сессию и авторизацию.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request_timing.start(settings.QUERYSTATS_ENABLED)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+            total_ms = timing.total_ms
+        finally:
+            request_timing.stop()
+        flags = _flags(timing, total_ms)
+        match = request.resolver_match
+        if timing.statements is not None:
+            querystats.collector.add(
+                match.view_name if match else None, timing.statements
+            )
+        level = logging.WARNING if flags else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(
+                level, _log_line(request, response, timing, total_ms, flags)
+            )
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = _server_timing(timing, total_ms)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Привязывает к основной базе пользователя, который что-то записал.
+
+    Пока жива cookie REPLICA_PIN_COOKIE, view с replica_reads читают
+    основную базу, и пользователь видит свой пост или комментарий,
+    даже если реплика еще не догнала основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.start_request(
+            settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.finish_request()
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,162 @@
+"""Статистика SQL-запросов по отпечаткам.
+
+В режиме QUERYSTATS_ENABLED ServerTimingMiddleware передает сюда все
+запросы обработанного запроса. Каждый запрос сводится к отпечатку:
+литералы и параметры заменяются на ?, списки IN (...) схлопываются,
+поэтому «один и тот же запрос с разными id» считается вместе.
+Агрегаты по (view, отпечаток) - число, суммарное время и гистограмма
+для p95 - периодически сбрасываются строками JSON в лог
+yatube.querystats (RotatingFileHandler в LOGGING). Команда querystats
+читает эти файлы и показывает самые дорогие запросы.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from logging import handlers
+
+from django.conf import settings
+
+logger = logging.getLogger("yatube.querystats")
+
+# Границы корзин гистограммы растут в HISTOGRAM_FACTOR раз, поэтому
+# p95 из гистограммы завышен не больше чем на четверть.
+HISTOGRAM_BASE_MS = 0.01
+HISTOGRAM_FACTOR = 1.25
+
+_NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def fingerprint(sql):
+    """Текст запроса без литералов и параметров."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def bucket(ms):
+    if ms <= HISTOGRAM_BASE_MS:
+        return 0
+    return math.ceil(
+        math.log(ms / HISTOGRAM_BASE_MS) / math.log(HISTOGRAM_FACTOR)
+    )
+
+
+def bucket_ms(index):
+    """Верхняя граница корзины."""
+    return HISTOGRAM_BASE_MS * HISTOGRAM_FACTOR ** index
+
+
+def percentile(histogram, percent):
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    needed = math.ceil(total * percent / 100)
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= needed:
+            return bucket_ms(index)
+    return bucket_ms(max(histogram))
+
+
+class Stats:
+    """Число, суммарное время и гистограмма одного отпечатка."""
+
+    def __init__(self, count=0, total_ms=0.0, histogram=None):
+        self.count = count
+        self.total_ms = total_ms
+        self.histogram = Counter(histogram or {})
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.histogram[bucket(ms)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.histogram.update(other.histogram)
+
+    @property
+    def p95_ms(self):
+        return percentile(self.histogram, 95)
+
+
+class Collector:
+    """Агрегаты текущего процесса между сбросами в файл."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.requests = 0
+        self.flushed = time.monotonic()
+
+    def add(self, view, queries):
+        with self.lock:
+            for sql, ms in queries:
+                key = (view or "-", fingerprint(sql))
+                self.stats.setdefault(key, Stats()).add(ms)
+            self.requests += 1
+            due = (
+                self.requests >= settings.QUERYSTATS_FLUSH_REQUESTS
+                or time.monotonic() - self.flushed
+                >= settings.QUERYSTATS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            stats, self.stats = self.stats, {}
+            self.requests = 0
+            self.flushed = time.monotonic()
+        for (view, sql), item in stats.items():
+            logger.info(json.dumps({
+                "view": view,
+                "fingerprint": sql,
+                "count": item.count,
+                "total_ms": round(item.total_ms, 3),
+                "histogram": item.histogram,
+            }, ensure_ascii=False))
+
+
+collector = Collector()
+# Остаток агрегатов не должен пропадать при остановке процесса.
+atexit.register(collector.flush)
+
+
+class RotatingFileHandler(handlers.RotatingFileHandler):
+    """Ротируемый файл, каталог которого создается при первой записи."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def load(lines, by_view=True):
+    """Сводит строки файлов querystats в {(view, отпечаток): Stats}."""
+    merged = {}
+    for line in lines:
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        key = (row["view"] if by_view else "*", row["fingerprint"])
+        merged.setdefault(key, Stats()).merge(Stats(
+            row["count"],
+            row["total_ms"],
+            {int(index): n for index, n in row["histogram"].items()},
+        ))
+    return merged
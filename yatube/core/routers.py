@@ -0,0 +1,93 @@
+"""Чтение лент с реплик, запись - в основную базу.
+
+Реплики - алиасы из DATABASE_REPLICAS. На реплику уходят только
+чтения внутри view с декоратором replica_reads, все остальное (формы,
+админка, команды) читает основную базу. Реплика отстает, поэтому
+пользователь, который только что что-то записал, какое-то время
+читает основную базу: ReplicaPinMiddleware ставит ему cookie
+REPLICA_PIN_COOKIE на REPLICA_PIN_SECONDS секунд.
+"""
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = threading.local()
+
+
+def start_request(pinned):
+    _state.pinned = pinned
+    _state.wrote = False
+
+
+def finish_request():
+    """True, если за запрос была хоть одна запись."""
+    wrote = getattr(_state, "wrote", False)
+    _state.pinned = _state.wrote = False
+    return wrote
+
+
+def replica_reads(view):
+    """Чтения внутри view идут на реплику, если нет привязки."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        _state.replica_reads = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _state.replica_reads = False
+
+    return wrapper
+
+
+def _use_replica():
+    return (
+        settings.DATABASE_REPLICAS
+        and getattr(_state, "replica_reads", False)
+        and not getattr(_state, "pinned", False)
+        and not getattr(_state, "wrote", False)
+    )
+
+
+def reading_replica():
+    return bool(_use_replica())
+
+
+def cache_source():
+    """Метка данных для ключей HTML-кеша.
+
+    Фрагмент, собранный из отстающей реплики, не должен попасть
+    к пользователю, привязанному к основной базе, поэтому у реплики
+    свои ключи.
+    """
+    return "replica" if reading_replica() else "primary"
+
+
+def cache_timeout(timeout):
+    """Срок жизни HTML из реплики - не дольше ее отставания."""
+    if reading_replica():
+        return min(timeout, settings.REPLICA_PIN_SECONDS)
+    return timeout
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # После записи тот же запрос читает только основную базу.
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема попадает на реплики вместе с копией базы.
+        return db not in settings.DATABASE_REPLICAS
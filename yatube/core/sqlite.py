@@ -0,0 +1,21 @@
+"""Настройки соединений SQLite для боевой нагрузки.
+
+Пока пишет create_post или add_comment, читатели в режиме журнала
+по умолчанию (DELETE) ждут. В WAL чтение идет параллельно с записью,
+synchronous=NORMAL в WAL безопасен для целостности и не делает fsync
+на каждую транзакцию, mmap и cache_size держат горячие страницы в
+памяти, busy_timeout заставляет писателей ждать блокировку, а не
+падать сразу с «database is locked». Прагмы берутся из SQLITE_PRAGMAS
+и применяются к каждому новому соединению; с CONN_MAX_AGE соединение
+живет между запросами, и это происходит редко.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,153 @@
+"""Дата-иерархия changelist из запросов по индексу даты.
+
+Стандартный тег date_hierarchy строит меню через Min/Max и
+QuerySet.dates() по всей таблице: SELECT DISTINCT по функции от даты
+читает каждую строку. Здесь границы берутся первой и последней строкой
+по индексу, дни месяца и месяцы года - одним dates() в пределах уже
+выбранного месяца или года (поиск диапазона по индексу), а годы -
+переходом по индексу к первой строке следующего года, то есть одним
+запросом на год, в котором есть строки. Разметка - стандартный
+admin/date_hierarchy.html.
+"""
+import calendar
+import datetime
+
+from django import template
+from django.conf import settings
+from django.db import models
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.timezone import localtime, make_aware
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+def _moment(year, month=1, day=1):
+    moment = datetime.datetime(year, month, day)
+    return make_aware(moment) if settings.USE_TZ else moment
+
+
+def _dates(queryset, field, kind, start, end):
+    """Различные дни или месяцы между start и end одним запросом."""
+    queryset = queryset.filter(**{
+        f"{field}__gte": start, f"{field}__lt": end
+    })
+    model_field = queryset.model._meta.get_field(field)
+    if isinstance(model_field, models.DateTimeField):
+        return [
+            value.date() for value in queryset.datetimes(field, kind)
+        ]
+    return list(queryset.dates(field, kind))
+
+
+def _edge(queryset, field, ordering):
+    value = queryset.order_by(ordering).values_list(
+        field, flat=True
+    ).first()
+    if value is not None and settings.USE_TZ:
+        value = localtime(value)
+    return value
+
+
+def _years(queryset, field, first):
+    """Годы, в которых есть строки: по запросу на каждый такой год."""
+    years = []
+    while first is not None:
+        years.append(first.year)
+        first = _edge(
+            queryset.filter(**{f"{field}__gte": _moment(first.year + 1)}),
+            field,
+            field,
+        )
+    return years
+
+
+@register.inclusion_tag("admin/date_hierarchy.html")
+def indexed_date_hierarchy(cl):
+    field = cl.date_hierarchy
+    year_field = f"{field}__year"
+    month_field = f"{field}__month"
+    day_field = f"{field}__day"
+    year = cl.params.get(year_field)
+    month = cl.params.get(month_field)
+    day = cl.params.get(day_field)
+    queryset = cl.queryset
+
+    def link(filters):
+        return cl.get_query_string(filters, [f"{field}__"])
+
+    if not (year or month or day):
+        first = _edge(queryset, field, field)
+        last = _edge(queryset, field, f"-{field}")
+        if first is None:
+            return {"show": True, "back": None, "choices": []}
+        if first.year == last.year:
+            year = first.year
+            if first.month == last.month:
+                month = first.month
+
+    if year and month and day:
+        date = datetime.date(int(year), int(month), int(day))
+        return {
+            "show": True,
+            "back": {
+                "link": link({year_field: year, month_field: month}),
+                "title": capfirst(formats.date_format(
+                    date, "YEAR_MONTH_FORMAT"
+                )),
+            },
+            "choices": [{
+                "title": capfirst(formats.date_format(
+                    date, "MONTH_DAY_FORMAT"
+                )),
+            }],
+        }
+    if year and month:
+        year, month = int(year), int(month)
+        days = calendar.monthrange(year, month)[1]
+        dates = _dates(
+            queryset,
+            field,
+            "day",
+            _moment(year, month),
+            _moment(year, month, days) + datetime.timedelta(days=1),
+        )
+        return {
+            "show": True,
+            "back": {"link": link({year_field: year}), "title": str(year)},
+            "choices": [{
+                "link": link({
+                    year_field: year,
+                    month_field: month,
+                    day_field: date.day,
+                }),
+                "title": capfirst(formats.date_format(
+                    date, "MONTH_DAY_FORMAT"
+                )),
+            } for date in dates],
+        }
+    if year:
+        year = int(year)
+        months = _dates(
+            queryset, field, "month", _moment(year), _moment(year + 1)
+        )
+        return {
+            "show": True,
+            "back": {"link": link({}), "title": _("All dates")},
+            "choices": [{
+                "link": link({year_field: year, month_field: date.month}),
+                "title": capfirst(formats.date_format(
+                    date, "YEAR_MONTH_FORMAT"
+                )),
+            } for date in months],
+        }
+    years = _years(queryset, field, first)
+    return {
+        "show": True,
+        "back": None,
+        "choices": [{
+            "link": link({year_field: str(number)}),
+            "title": str(number),
+        } for number in years],
+    }
@@ -0,0 +1,129 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+from .admin import EstimatedCountPaginator
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f"Пост {number}")
+            for number in range(12)
+        )
+
+    def test_exact_count_below_limit(self):
+        paginator = EstimatedCountPaginator(Post.objects.all(), 5)
+        self.assertEqual(paginator.count, 12)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_estimate_above_limit(self):
+        """Над порогом - оценка по таблице, у фильтра - «больше порога»"""
+        Post.objects.filter(pk=Post.objects.order_by("pk")[0].pk).delete()
+        paginator = EstimatedCountPaginator(Post.objects.all(), 5)
+        # Без ANALYZE оценка - наибольший id, удаленные строки в ней есть.
+        self.assertEqual(paginator.count, Post.objects.latest("pk").pk)
+        filtered = EstimatedCountPaginator(
+            Post.objects.filter(author=self.author), 5
+        )
+        self.assertEqual(filtered.count, 6)
+
+    def test_page_keeps_queryset_and_order(self):
+        posts = Post.objects.order_by("-pub_date", "-pk")
+        page = EstimatedCountPaginator(posts, 5).page(2)
+        self.assertEqual(list(page.object_list), list(posts[5:10]))
+        self.assertTrue(hasattr(page.object_list, "filter"))
+
+
+class ChangelistQueriesTest(TestCase):
+    """Число запросов changelist не зависит от числа строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        cls.groups = [
+            Group.objects.create(title=f"Группа {number}", slug=f"g{number}")
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f"user{number}")
+            post = Post.objects.create(
+                author=author,
+                group=self.groups[number % 3],
+                text=f"Пост {number}",
+            )
+            Comment.objects.create(post=post, author=author, text="К")
+            Follow.objects.create(user=author, author=self.admin)
+
+    def query_counts(self):
+        counts = {}
+        for model in ("post", "comment", "follow", "group"):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse(f"admin:posts_{model}_changelist")
+                )
+            self.assertEqual(response.status_code, 200)
+            counts[model] = len(queries)
+        return counts
+
+    def test_query_count_is_constant(self):
+        self.add_rows(2)
+        few = self.query_counts()
+        self.add_rows(20)
+        self.assertEqual(self.query_counts(), few)
+
+    def test_date_hierarchy_queries_do_not_grow_with_days(self):
+        self.add_rows(10)
+        url = reverse("admin:posts_post_changelist")
+        moment = Post.objects.latest("pk").pub_date.replace(day=1, hour=12)
+        for number, post in enumerate(Post.objects.order_by("pk")):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=moment.replace(day=1 + number % 2)
+            )
+        cache.clear()
+        with CaptureQueriesContext(connection) as two_days:
+            self.client.get(url)
+        for number, post in enumerate(Post.objects.order_by("pk")):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=moment.replace(day=1 + number)
+            )
+        cache.clear()
+        with CaptureQueriesContext(connection) as ten_days:
+            response = self.client.get(url)
+        self.assertEqual(len(ten_days), len(two_days))
+        self.assertContains(response, f"pub_date__day={moment.day + 9}")
+
+    def test_changelist_ordering_uses_index(self):
+        for queryset in (
+            Comment.objects.order_by("-created", "-id"),
+            Follow.objects.order_by("-pub_date", "-id"),
+        ):
+            sql, params = queryset[:100].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+            with self.subTest(model=queryset.model.__name__):
+                self.assertNotIn("TEMP B-TREE", plan)
+                self.assertIn("USING INDEX", plan)
+
+    def test_date_hierarchy_menu(self):
+        self.add_rows(1)
+        response = self.client.get(reverse("admin:posts_post_changelist"))
+        year = Post.objects.get().pub_date.year
+        self.assertContains(response, f"pub_date__year={year}")
+        self.assertNotContains(response, "django_date_trunc")
@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+from .auth import LEGACY_BACKEND, USER_KEY, CachedModelBackend
+
+
+class AnonymousRequestTest(TestCase):
+    """Запрос без cookie сессии не читает ни сессию, ни пользователя"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.post = Post.objects.create(
+            author=author, group=cls.group, text="Пост"
+        )
+
+    def test_feeds_skip_session(self):
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=(self.group.slug,)),
+            reverse("posts:post_detail", args=(self.post.pk,)),
+        )
+        tables = [
+            f'FROM "{model._meta.db_table}"' for model in (Session, User)
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertFalse(response.context["user"].is_authenticated)
+                self.assertNotIn("Cookie", response.get("Vary", ""))
+                self.assertFalse([
+                    query for query in queries
+                    if any(table in query["sql"] for table in tables)
+                ])
+
+
+# Тесты идут в одном процессе, поэтому общий кеш здесь - LocMemCache.
+SHARED = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "test-auth-shared",
+}
+
+
+@override_settings(
+    CACHES={"default": settings.CACHES["default"], "shared": SHARED},
+    SESSION_CACHE_ALIAS="shared",
+    AUTH_USER_CACHE_ALIAS="shared",
+)
+class CachedSessionUserTest(TestCase):
+    """Сессия и пользователь читаются из общего кеша"""
+
+    def setUp(self):
+        # Тесты меняют пароль и is_active, поэтому пользователь свой
+        # у каждого теста, а не общий из setUpTestData.
+        self.user = User.objects.create_user(username="reader")
+        caches["shared"].clear()
+
+    def test_session_modes(self):
+        for mode in ("cached_db", "cache", "signed_cookies"):
+            with self.subTest(mode=mode), override_settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES[mode]
+            ):
+                client = self.client_class()
+                client.force_login(self.user)
+                client.get(reverse("about:author"))
+                with self.assertNumQueries(0):
+                    response = client.get(reverse("about:author"))
+                self.assertEqual(response.context["user"], self.user)
+
+    def test_password_change_drops_cached_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("about:author"))
+        self.user.set_password("new-password")
+        self.user.save()
+        response = self.client.get(reverse("about:author"))
+        self.assertFalse(response.context["user"].is_authenticated)
+
+    def test_inactive_user_is_logged_out(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("about:author"))
+        self.user.is_active = False
+        self.user.save(update_fields=("is_active",))
+        response = self.client.get(reverse("about:author"))
+        self.assertFalse(response.context["user"].is_authenticated)
+
+    def cached_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("about:author"))
+        return CachedModelBackend().get_user(self.user.pk)
+
+    def test_cache_holds_no_password_hash(self):
+        self.cached_user()
+        data = caches["shared"].get(USER_KEY.format(self.user.pk))
+        self.assertNotIn(self.user.password, repr(data))
+
+    def test_staff_is_not_cached(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.cached_user()
+        self.assertIsNone(caches["shared"].get(USER_KEY.format(self.user.pk)))
+
+    def test_cached_user_changes_password(self):
+        self.user.set_password("old-password")
+        self.user.save()
+        user = self.cached_user()
+        with self.assertNumQueries(0):
+            old_hash = user.get_session_auth_hash()
+        self.assertEqual(old_hash, self.user.get_session_auth_hash())
+        self.assertTrue(user.check_password("old-password"))
+        user.set_password("new-password")
+        self.assertNotEqual(user.get_session_auth_hash(), old_hash)
+        user.first_name = "Новое имя"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("new-password"))
+        self.assertEqual(self.user.first_name, "Новое имя")
+
+    def test_legacy_backend_session_stays_logged_in(self):
+        self.client.force_login(self.user, backend=LEGACY_BACKEND)
+        response = self.client.get(reverse("about:author"))
+        self.assertEqual(response.context["user"], self.user)
+        self.assertEqual(
+            self.client.session[BACKEND_SESSION_KEY],
+            settings.AUTHENTICATION_BACKENDS[0],
+        )
+
+
+class NoSharedCacheTest(TestCase):
+    """Без общего кеша пользователь каждый раз читается из auth_user"""
+
+    @override_settings(AUTH_USER_CACHE_ALIAS=None)
+    def test_user_is_not_cached(self):
+        user = User.objects.create_user(username="reader")
+        self.client.force_login(user)
+        self.client.get(reverse("about:author"))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("about:author"))
+        self.assertTrue([
+            query for query in queries
+            if f'FROM "{User._meta.db_table}"' in query["sql"]
+        ])
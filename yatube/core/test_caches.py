@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from .caches import SQLiteCache
+
+
+def _bump(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr("counter")
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.location = os.path.join(self.directory, "cache.sqlite3")
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_get_set_and_versions(self):
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(self.cache.get("key"), {"value": 1})
+        self.assertIsNone(self.cache.get("key", version=2))
+        self.cache.incr_version("key")
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.get("key", version=2), {"value": 1})
+
+    def test_batches_and_expiry(self):
+        self.cache.set_many({f"key{n}": n for n in range(700)})
+        self.cache.set("gone", 1, timeout=-1)
+        keys = [f"key{n}" for n in range(700)] + ["gone", "missing"]
+        self.assertEqual(
+            self.cache.get_many(keys), {f"key{n}": n for n in range(700)}
+        )
+        self.cache.delete_many(keys)
+        self.assertEqual(self.cache.get_many(keys), {})
+
+    def test_add_incr_touch(self):
+        self.assertTrue(self.cache.add("key", 1))
+        self.assertFalse(self.cache.add("key", 2))
+        self.assertEqual(self.cache.incr("key", 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+        self.assertTrue(self.cache.touch("key", None))
+        self.assertFalse(self.cache.touch("missing"))
+
+    def test_cull_keeps_table_bounded(self):
+        cache = SQLiteCache(self.location, {
+            "OPTIONS": {
+                "MAX_ENTRIES": 10, "CULL_FREQUENCY": 2, "CULL_EVERY": 5
+            },
+        })
+        for number in range(40):
+            cache.set(f"key{number}", number)
+        with sqlite3.connect(self.location) as connection:
+            count, = connection.execute(
+                "SELECT COUNT(*) FROM cache"
+            ).fetchone()
+        self.assertLessEqual(count, 15)
+
+    def test_processes_share_atomic_incr(self):
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_bump, args=(self.location, 50))
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 150)
+
+
+class TwoLevelCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(CACHES={
+            "default": {
+                "BACKEND": "core.caches.TwoLevelCache",
+                "LOCATION": directory,
+                "OPTIONS": {"L2": "shared", "L1_TIMEOUT": 60},
+            },
+            "shared": {
+                "BACKEND": "core.caches.SQLiteCache",
+                "LOCATION": os.path.join(directory, "cache.sqlite3"),
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = caches["default"]
+        self.shared = caches["shared"]
+
+    def test_l1_serves_until_its_ttl(self):
+        self.cache.set("key", "old")
+        # Другой процесс меняет только общий кеш.
+        self.shared.set("key", "new")
+        self.assertEqual(self.cache.get("key"), "old")
+        self.cache.l1.clear()
+        self.assertEqual(self.cache.get("key"), "new")
+
+    def test_get_many_fills_l1_from_l2(self):
+        self.shared.set_many({"a": 1, "b": 2})
+        self.assertEqual(
+            self.cache.get_many(["a", "b", "c"]), {"a": 1, "b": 2}
+        )
+        with mock.patch.object(self.shared, "get_many") as shared_get:
+            self.assertEqual(self.cache.get_many(["a", "b"]), {"a": 1, "b": 2})
+        shared_get.assert_not_called()
+
+    def test_writes_reach_both_levels(self):
+        self.cache.set("version", 1, None)
+        self.assertEqual(self.cache.incr("version"), 2)
+        self.assertEqual(self.shared.get("version"), 2)
+        self.assertEqual(self.cache.l1.get("version"), 2)
+        self.cache.delete("version")
+        self.assertIsNone(self.cache.get("version"))
+        self.assertIsNone(self.shared.get("version"))
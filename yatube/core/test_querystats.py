@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import querystats
+from posts.models import Post
+
+User = get_user_model()
+
+
+class FingerprintTest(TestCase):
+    def test_literals_and_lists_are_stripped(self):
+        self.assertEqual(
+            querystats.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 2, 3)\n"
+                "  AND c = %s LIMIT 21"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ? LIMIT ?",
+        )
+        self.assertEqual(
+            querystats.fingerprint("SELECT id FROM t WHERE id IN (%s, %s)"),
+            querystats.fingerprint("SELECT id FROM t WHERE id IN (%s)"),
+        )
+
+    def test_percentile_from_histogram(self):
+        stats = querystats.Stats()
+        for ms in [1] * 95 + [100] * 5:
+            stats.add(ms)
+        self.assertLessEqual(stats.p95_ms, 1.25)
+        self.assertGreaterEqual(stats.p95_ms, 1)
+        stats.add(100)
+        self.assertGreaterEqual(stats.p95_ms, 100)
+
+
+@override_settings(
+    QUERYSTATS_ENABLED=True,
+    QUERYSTATS_FLUSH_REQUESTS=2,
+)
+class CaptureTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username="author")
+        Post.objects.create(author=author, text="Пост")
+
+    def test_capture_and_report(self):
+        url = reverse("posts:profile", args=("author",))
+        with self.assertLogs("yatube.querystats", "INFO") as logs:
+            self.client.get(url)
+            self.client.get(url)
+        lines = [record.getMessage() for record in logs.records]
+        stats = querystats.load(lines)
+        views = {view for view, _ in stats}
+        self.assertEqual(views, {"posts:profile"})
+        user_query = [
+            item for (_, sql), item in stats.items()
+            if 'FROM "auth_user"' in sql and "username" in sql
+        ]
+        self.assertTrue(user_query)
+        self.assertTrue(all(item.count >= 2 for item in user_query))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "querystats.jsonl")
+        with open(path, "w", encoding="utf-8") as dump:
+            dump.write("\n".join(lines))
+        out = StringIO()
+        call_command("querystats", path, "--top", "3", stdout=out)
+        self.assertIn("posts:profile", out.getvalue())
+        self.assertEqual(out.getvalue().count("posts:profile"), 3)
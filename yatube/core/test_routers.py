@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import routers
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.start_request(pinned=False)
+        self.addCleanup(routers.finish_request)
+
+    def read_inside_view(self, before=None):
+        @routers.replica_reads
+        def view():
+            if before:
+                before()
+            return (
+                self.router.db_for_read(Post),
+                routers.cache_source(),
+                routers.cache_timeout(3600),
+            )
+
+        return view()
+
+    def test_feed_reads_go_to_replica(self):
+        self.assertEqual(
+            self.read_inside_view(), ("replica", "replica", 10)
+        )
+        self.assertEqual(self.router.db_for_read(Post), "default")
+        self.assertEqual(routers.cache_source(), "primary")
+
+    def test_read_your_writes_inside_request(self):
+        db, source, timeout = self.read_inside_view(
+            lambda: self.router.db_for_write(Post)
+        )
+        self.assertEqual((db, source, timeout), ("default", "primary", 3600))
+        self.assertTrue(routers.finish_request())
+
+    def test_pinned_user_reads_primary(self):
+        routers.start_request(pinned=True)
+        self.assertEqual(self.read_inside_view()[0], "default")
+
+    def test_migrations_skip_replicas(self):
+        self.assertFalse(self.router.allow_migrate("replica", "posts"))
+        self.assertTrue(self.router.allow_migrate("default", "posts"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaPinMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="author")
+        self.client.force_login(self.user)
+
+    def test_write_sets_pin_cookie(self):
+        response = self.client.post(
+            reverse("posts:create_post"), {"text": "Новый пост"}
+        )
+        cookie = response.cookies[routers.settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], 10)
+        # Привязанный пользователь читает ленту с основной базы.
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "Новый пост")
+
+    def test_read_does_not_pin(self):
+        response = self.client.get(reverse("about:author"))
+        self.assertNotIn(
+            routers.settings.REPLICA_PIN_COOKIE, response.cookies
+        )
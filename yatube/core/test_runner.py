@@ -0,0 +1,26 @@
+import logging
+
+from django.test.runner import DiscoverRunner
+
+
+class QuietRequestLogRunner(DiscoverRunner):
+    """DiscoverRunner, под которым журнал запросов молчит.
+
+    Иначе каждый запрос тестового клиента печатал бы строку JSON
+    (или писал в YATUBE_REQUEST_LOG). Уровень фиксируется WARNING,
+    чтобы тесты не зависели от YATUBE_REQUEST_LOG_LEVEL; assertLogs
+    по-прежнему видит записи.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        logger = logging.getLogger("yatube.requests")
+        self._request_log = (logger.handlers, logger.level)
+        logger.handlers = [logging.NullHandler()]
+        logger.setLevel(logging.WARNING)
+
+    def teardown_test_environment(self, **kwargs):
+        logger = logging.getLogger("yatube.requests")
+        logger.handlers, level = self._request_log
+        logger.setLevel(level)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username="author")
+        Post.objects.create(author=author, text="Пост")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_reports_queries_templates_and_cache(self):
+        response = self.client.get(reverse("posts:index"))
+        header = response["Server-Timing"]
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(header, r"tpl;dur=[\d.]+")
+        self.assertRegex(header, r"total;dur=[\d.]+")
+        self.assertRegex(header, r'cache;desc="\d+ hits, [1-9]\d* misses"')
+        warm = self.client.get(reverse("posts:index"))["Server-Timing"]
+        self.assertRegex(warm, r'cache;desc="[1-9]\d* hits, 0 misses"')
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_log_line_and_thresholds(self):
+        with self.assertLogs("yatube.requests", "INFO") as logs:
+            self.client.get(reverse("posts:index"))
+        self.assertIn('"view": "posts:index"', logs.output[0])
+        self.assertIn('"flags": []', logs.output[0])
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        with override_settings(SLOW_REQUEST_QUERIES=0):
+            with self.assertLogs("yatube.requests", "WARNING") as logs:
+                self.client.get(reverse("posts:index"))
+        self.assertIn('"flags": ["many_queries"]', logs.output[0])
+
+    def test_disabled_level_skips_log_line(self):
+        with mock.patch("core.middleware.json.dumps") as dumps:
+            self.client.get(reverse("posts:index"))
+        dumps.assert_not_called()
@@ -0,0 +1,136 @@
+"""Сбор времени запроса: SQL, шаблоны и кеш.
+
+RequestTiming живет в thread-local, пока ServerTimingMiddleware
+обрабатывает запрос. Запросы к БД считает обертка
+connection.execute_wrapper, шаблоны - бэкенд TimedDjangoTemplates,
+кеш - бэкенды с TimedCacheMixin. Вне запроса (команды, воркеры)
+коллектора нет, и все это ничего не делает.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends import locmem
+from django.template.backends.django import DjangoTemplates, Template
+
+_local = threading.local()
+_MISSING = object()
+
+
+class RequestTiming:
+    def __init__(self, keep_statements=False):
+        self.started = time.perf_counter()
+        # (sql, мс) каждого запроса - только для querystats.
+        self.statements = [] if keep_statements else None
+        self.queries = 0
+        self.query_ms = 0.0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_depth = 0
+        self._cache_paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.query_ms += elapsed
+            if self.statements is not None:
+                self.statements.append((sql, elapsed))
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @contextmanager
+    def template(self):
+        # Вложенные рендеры (карточки внутри ленты) уже входят
+        # во время внешнего шаблона.
+        self._template_depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template_ms += (time.perf_counter() - started) * 1000
+
+    def count_cache(self, hits, misses):
+        if not self._cache_paused:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    @contextmanager
+    def cache_paused(self):
+        """Не считать get() внутри get_many() второй раз."""
+        paused, self._cache_paused = self._cache_paused, True
+        try:
+            yield
+        finally:
+            self._cache_paused = paused
+
+
+def start(keep_statements=False):
+    _local.timing = RequestTiming(keep_statements)
+    return _local.timing
+
+
+def stop():
+    _local.timing = None
+
+
+def current():
+    return getattr(_local, "timing", None)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timing = current()
+        if timing is None:
+            return super().render(context, request)
+        with timing.template():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, который засекает время рендера."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            super().from_string(template_code).template, self
+        )
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self
+        )
+
+
+class TimedCacheMixin:
+    """Считает попадания и промахи кеша для текущего запроса."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        timing = current()
+        if timing is not None:
+            hit = value is not _MISSING
+            timing.count_cache(int(hit), int(not hit))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        timing = current()
+        if timing is None:
+            return super().get_many(keys, version)
+        with timing.cache_paused():
+            values = super().get_many(keys, version)
+        timing.count_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class LocMemCache(TimedCacheMixin, locmem.LocMemCache):
+    pass
@@ -1,10 +1,130 @@
+from django import forms
 from django.conf import settings
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
 
-from .models import Comment, Follow, Group, Post
+from core.admin import ScalableAdminMixin
 
+from . import bulk, search
+from .models import BulkJob, Comment, Follow, Group, Post
 
-class PostAdmin(admin.ModelAdmin):
+
+class FullTextSearchMixin:
+    """Поиск в админке по индексу FTS5 вместо LIKE по полю text."""
+
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.enabled():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(
+            pk__in=search.matching_ids(search_term, self.search_kind)
+        ), False
+
+
+class MoveToGroupForm(forms.Form):
+    def __init__(self, *args, admin_site, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Автодополнение по поиску GroupAdmin: в разметку попадает
+        # только выбранная группа, а не вся таблица.
+        self.fields["group"] = forms.ModelChoiceField(
+            Group.objects.all(),
+            label="Группа",
+            widget=AutocompleteSelect(
+                BulkJob._meta.get_field("group").remote_field, admin_site
+            ),
+        )
+
+
+class BulkJobActionsMixin:
+    """Массовые действия над постами фоновыми заданиями (posts.bulk)."""
+
+    bulk_confirm_template = "admin/posts/post/bulk_job_confirm.html"
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Стандартное удаление загружает и удаляет посты по одному.
+        actions.pop("delete_selected", None)
+        return actions
+
+    def _bulk_job(self, request, queryset, action, question, form=None):
+        if request.POST.get("apply") and (form is None or form.is_valid()):
+            job = bulk.enqueue(
+                action,
+                queryset,
+                request.user,
+                form.cleaned_data["group"] if form else None,
+            )
+            self.message_user(
+                request,
+                format_html(
+                    'Задание поставлено в очередь: <a href="{}">{}</a>',
+                    reverse("admin:posts_bulkjob_change", args=(job.pk,)),
+                    job,
+                ),
+                messages.SUCCESS,
+            )
+            return None
+        return TemplateResponse(request, self.bulk_confirm_template, {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": question,
+            "count": queryset.count(),
+            "form": form,
+            "action": request.POST.get("action"),
+            "select_across": request.POST.get("select_across") == "1",
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    def delete_posts(self, request, queryset):
+        return self._bulk_job(
+            request, queryset, BulkJob.DELETE_POSTS, "Удалить посты?"
+        )
+
+    delete_posts.short_description = "Удалить выбранные посты (в фоне)"
+    delete_posts.allowed_permissions = ("delete",)
+
+    def move_to_group(self, request, queryset):
+        return self._bulk_job(
+            request,
+            queryset,
+            BulkJob.MOVE_TO_GROUP,
+            "Перенести посты в группу?",
+            MoveToGroupForm(
+                request.POST if "apply" in request.POST else None,
+                admin_site=self.admin_site,
+            ),
+        )
+
+    move_to_group.short_description = "Перенести в группу (в фоне)"
+    move_to_group.allowed_permissions = ("change",)
+
+    def purge_comments(self, request, queryset):
+        return self._bulk_job(
+            request,
+            queryset,
+            BulkJob.PURGE_COMMENTS,
+            "Удалить все комментарии постов?",
+        )
+
+    purge_comments.short_description = "Удалить комментарии (в фоне)"
+    purge_comments.allowed_permissions = ("delete",)
+
+
+class PostAdmin(
+    FullTextSearchMixin,
+    BulkJobActionsMixin,
+    ScalableAdminMixin,
+    admin.ModelAdmin,
+):
     list_display = (
         "pk",
         "text",
@@ -13,17 +133,26 @@ class PostAdmin(admin.ModelAdmin):
         "group",
     )
     list_editable = ("group",)
+    list_select_related = ("author", "group")
+    actions = ("delete_posts", "move_to_group", "purge_comments")
     search_fields = ("text",)
+    search_kind = search.POST
     list_filter = ("pub_date",)
+    date_hierarchy = "pub_date"
+    autocomplete_fields = ("author",)
+    shared_choice_fields = ("group",)
     empty_value_display = settings.EMPTY_VALUE
 
 
-class GroupAdmin(admin.ModelAdmin):
-    list_display = ("pk", "title", "slug", "description")
-    search_fields = "title"
+class GroupAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("pk", "title", "slug", "description", "posts_count")
+    search_fields = ("title", "slug")
+    prepopulated_fields = {"slug": ("title",)}
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(
+    FullTextSearchMixin, ScalableAdminMixin, admin.ModelAdmin
+):
     list_display = (
         "pk",
         "post",
@@ -31,24 +160,80 @@ class CommentAdmin(admin.ModelAdmin):
         "text",
         "created",
     )
+    list_select_related = ("post", "author")
     search_fields = ("text",)
+    search_kind = search.COMMENT
     list_filter = ("created",)
+    date_hierarchy = "created"
+    raw_id_fields = ("post",)
+    autocomplete_fields = ("author",)
     empty_value_display = settings.EMPTY_VALUE
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "pk",
-        "title",
-        "slug",
+        "user",
+        "author",
+        "pub_date",
     )
-    list_editable = ("title",)
-    search_fields = ("slug",)
-    list_filter = ("title",)
+    list_select_related = ("user", "author")
+    # Точное совпадение имени ищется по уникальному индексу username.
+    search_fields = ("=user__username", "=author__username")
+    list_filter = ("pub_date",)
+    date_hierarchy = "pub_date"
+    autocomplete_fields = ("user", "author")
     empty_value_display = settings.EMPTY_VALUE
 
 
+class BulkJobAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        "pk",
+        "action",
+        "status",
+        "progress",
+        "created_by",
+        "created",
+        "finished",
+    )
+    list_select_related = ("created_by",)
+    list_filter = ("status", "action")
+    readonly_fields = (
+        "action",
+        "status",
+        "group",
+        "progress",
+        "error",
+        "created_by",
+        "created",
+        "heartbeat",
+        "finished",
+    )
+    exclude = ("post_ids", "total", "processed")
+    actions = ("retry",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress(self, job):
+        percent = job.processed * 100 // job.total if job.total else 100
+        return f"{job.processed} из {job.total} ({percent}%)"
+
+    progress.short_description = "Выполнено"
+
+    def retry(self, request, queryset):
+        # Задание продолжится с первой необработанной пачки; зависшее
+        # задание упавшего воркера тоже можно перезапустить.
+        count = queryset.filter(
+            Q(status=BulkJob.FAILED) | bulk.stale()
+        ).update(status=BulkJob.PENDING, error="")
+        self.message_user(request, f"Снова в очереди: {count}")
+
+    retry.short_description = "Перезапустить прерванные"
+
+
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(BulkJob, BulkJobAdmin)
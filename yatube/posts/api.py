@@ -0,0 +1,300 @@
+"""JSON API только для чтения: посты, группы, комментарии и лента подписок.
+
+Ответы собираются из .values(), без экземпляров моделей: каждое поле
+ресурса - это lookup ORM и, при необходимости, преобразование
+значения. Параметр fields выбирает нужные поля, и только они
+попадают в SELECT. Списки листаются теми же курсорами, что и HTML,
+а ETag строится из версий соответствующей HTML-страницы и параметров
+запроса (posts.etags).
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from core.routers import replica_reads
+
+from .etags import (api_group_posts_etag, api_groups_etag, api_index_etag,
+                    api_post_detail_etag, api_profile_etag)
+from .models import Comment, Group, Post, User
+from .paginators import CursorPaginator, encode_cursor
+from .timeline import TimelinePaginator
+
+
+class Field:
+    def __init__(self, lookup, convert=None):
+        self.lookup = lookup
+        self.convert = convert
+
+
+def _image_url(name):
+    return default_storage.url(name) if name else None
+
+
+POST_FIELDS = {
+    "id": Field("id"),
+    "text": Field("text"),
+    "pub_date": Field("pub_date"),
+    "author": Field("author__username"),
+    "group": Field("group__slug"),
+    "image": Field("image", _image_url),
+    "comments_count": Field("comments_count"),
+}
+COMMENT_FIELDS = {
+    "id": Field("id"),
+    "post": Field("post_id"),
+    "author": Field("author__username"),
+    "text": Field("text"),
+    "created": Field("created"),
+}
+GROUP_FIELDS = {
+    "id": Field("id"),
+    "title": Field("title"),
+    "slug": Field("slug"),
+    "description": Field("description"),
+    "posts_count": Field("posts_count"),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json(data, status=200):
+    # Без пробелов и \uXXXX: кириллица в UTF-8 вдвое короче.
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={"separators": (",", ":"), "ensure_ascii": False},
+    )
+
+
+def _error(detail, status):
+    return _json({"detail": detail}, status)
+
+
+def _selected(request, fields):
+    """Поля из параметра fields; без него - все поля ресурса."""
+    names = request.GET.get("fields")
+    if not names:
+        return list(fields)
+    names = [name.strip() for name in names.split(",") if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise BadRequest(f"Неизвестные поля: {', '.join(unknown)}")
+    return names
+
+
+def _lookups(fields, names, *required):
+    """Lookup'ы для .values(): выбранные поля и нужные курсору."""
+    lookups = [fields[name].lookup for name in names]
+    return lookups + [lookup for lookup in required if lookup not in lookups]
+
+
+def _serialize(row, fields, names):
+    item = {}
+    for name in names:
+        field = fields[name]
+        value = row[field.lookup]
+        item[name] = field.convert(value) if field.convert else value
+    return item
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit должен быть числом")
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+class ValuesCursorPaginator(CursorPaginator):
+    """Курсор из словаря .values(), а не из атрибутов объекта."""
+
+    def _cursor(self, direction, row):
+        return encode_cursor(
+            direction, row[self.date_field], row[self.pk_field]
+        )
+
+
+class ValuesTimelinePaginator(TimelinePaginator):
+    """Лента подписок строками .values() вместо объектов Post."""
+
+    def __init__(self, user, per_page, lookups):
+        super().__init__(user, per_page)
+        self.lookups = lookups
+
+    def _cursor(self, direction, row):
+        return encode_cursor(direction, row["pub_date"], row["id"])
+
+    def page_rows(self, cursor=None):
+        keys = self.page_keys(cursor)
+        rows = {
+            row["id"]: row
+            for row in Post.objects.filter(
+                pk__in=[pk for _, pk in keys]
+            ).values(*self.lookups)
+        }
+        return [rows[pk] for _, pk in keys if pk in rows]
+
+
+def _page(request, queryset, fields, date_field):
+    names = _selected(request, fields)
+    paginator = ValuesCursorPaginator(
+        queryset.values(*_lookups(fields, names, "id", date_field)),
+        _limit(request),
+        date_field=date_field,
+        pk_field="id",
+    )
+    page = paginator.get_page(request.GET.get("cursor"))
+    return _json({
+        "results": [_serialize(row, fields, names) for row in page],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+
+
+def api_view(view):
+    """Общие для API ответы на ошибки запроса."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return _error(str(error), 400)
+    return wrapper
+
+
+@replica_reads
+@require_GET
+@condition(etag_func=api_index_etag)
+@api_view
+def posts(request):
+    return _page(request, Post.objects.all(), POST_FIELDS, "pub_date")
+
+
+@replica_reads
+@require_GET
+@condition(etag_func=api_post_detail_etag)
+@api_view
+def post(request, post_id):
+    names = _selected(request, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *_lookups(POST_FIELDS, names)
+    ).first()
+    if row is None:
+        return _error("Пост не найден", 404)
+    return _json(_serialize(row, POST_FIELDS, names))
+
+
+@replica_reads
+@require_GET
+@condition(etag_func=api_post_detail_etag)
+@api_view
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return _error("Пост не найден", 404)
+    return _page(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS,
+        "created",
+    )
+
+
+@replica_reads
+@require_GET
+@condition(etag_func=api_groups_etag)
+@api_view
+def groups(request):
+    """Группы по возрастанию id; курсор - id последней группы.
+
+    Параметр q оставляет группы, чье название начинается с q без
+    учета регистра: так форма поста ищет группу, когда их слишком
+    много для списка. Поиск - диапазон по индексу search_title.
+
+    ETag - по версии GROUPS, а с полем posts_count и по версии INDEX
+    (posts.etags.api_groups_etag).
+    """
+    names = _selected(request, GROUP_FIELDS)
+    limit = _limit(request)
+    rows = Group.objects.order_by("id").values(
+        *_lookups(GROUP_FIELDS, names, "id")
+    )
+    query = Group.search_key(request.GET.get("q", "").strip())
+    if query:
+        # [q, q с увеличенным последним символом) - все строки,
+        # начинающиеся с q, без LIKE, который не использует индекс.
+        rows = rows.filter(
+            search_title__gte=query,
+            search_title__lt=query[:-1] + chr(ord(query[-1]) + 1),
+        )
+    after = request.GET.get("cursor", "")
+    if after.isdigit():
+        rows = rows.filter(id__gt=int(after))
+    rows = list(rows[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return _json({
+        "results": [_serialize(row, GROUP_FIELDS, names) for row in rows],
+        "next": str(rows[-1]["id"]) if more else None,
+    })
+
+
+@replica_reads
+@require_GET
+@condition(etag_func=api_group_posts_etag)
+@api_view
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "id", flat=True
+    ).first()
+    if group_id is None:
+        return _error("Группа не найдена", 404)
+    return _page(
+        request,
+        Post.objects.filter(group_id=group_id),
+        POST_FIELDS,
+        "pub_date",
+    )
+
+
+@replica_reads
+@require_GET
+@condition(etag_func=api_profile_etag)
+@api_view
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        "id", flat=True
+    ).first()
+    if author_id is None:
+        return _error("Автор не найден", 404)
+    return _page(
+        request,
+        Post.objects.filter(author_id=author_id),
+        POST_FIELDS,
+        "pub_date",
+    )
+
+
+@replica_reads
+@require_GET
+@api_view
+def follow(request):
+    """Лента подписок; для нее, как и для /follow/, ETag нет."""
+    if not request.user.is_authenticated:
+        return _error("Требуется авторизация", 401)
+    names = _selected(request, POST_FIELDS)
+    paginator = ValuesTimelinePaginator(
+        request.user,
+        _limit(request),
+        _lookups(POST_FIELDS, names, "id", "pub_date"),
+    )
+    page = paginator.get_page(request.GET.get("cursor"))
+    return _json({
+        "results": [_serialize(row, POST_FIELDS, names) for row in page],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
@@ -0,0 +1,200 @@
+"""Массовые действия админки над постами фоновыми заданиями.
+
+Админка только ставит в очередь BulkJob со списком id постов, а
+команда bulk_worker выполняет его пачками по BULK_JOB_BATCH_SIZE.
+Каждая пачка - одна короткая транзакция из update() и удалений без
+сигналов (каскад по всем внешним ключам, как у Collector); счетчики,
+поисковый индекс и версии кеша поправляются один раз на пачку, а не
+на каждую строку, как это сделали бы сигналы posts. Между пачками
+воркер отпускает блокировку записи SQLite на BULK_JOB_PAUSE секунд,
+поэтому сайт продолжает писать.
+Каждая пачка обновляет heartbeat задания; задание, у которого его
+нет дольше BULK_JOB_TIMEOUT, забирает другой воркер и продолжает с
+первой необработанной пачки.
+"""
+import datetime
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import card_cache, counters, feed_cache, search, thumbnails
+from .models import BulkJob, Comment, Group, Post
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(action, queryset, user=None, group=None):
+    """Ставит в очередь действие над постами queryset."""
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    return BulkJob.objects.create(
+        action=action,
+        post_ids=",".join(map(str, ids)),
+        total=len(ids),
+        group=group,
+        created_by=user,
+    )
+
+
+def _raw_delete(queryset):
+    # QuerySet.delete() при подписанных сигналах загружает каждую
+    # строку и шлет post_delete по одной; здесь их работу делает пачка.
+    return queryset._raw_delete(queryset.db)
+
+
+def _delete_cascade(queryset):
+    """Удаляет строки queryset и все, что удалил бы Collector, без сигналов.
+
+    Связи берутся из _meta, а не из списка моделей, поэтому внешний ключ,
+    добавленный позже, не останется висеть: CASCADE удаляется так же,
+    SET_NULL обнуляется, DO_NOTHING пропускается, а для остальных видов
+    on_delete задание падает, ничего не удалив.
+    """
+    for relation in queryset.model._meta.related_objects:
+        if relation.many_to_many:
+            raise ValueError(f"{relation} пачкой не удаляется")
+        related = relation.related_model._base_manager.filter(
+            **{f"{relation.field.name}__in": queryset}
+        )
+        if relation.on_delete is models.CASCADE:
+            _delete_cascade(related)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f"{relation} с on_delete={relation.on_delete.__name__} "
+                "пачкой не удаляется"
+            )
+    return _raw_delete(queryset)
+
+
+def _feeds(rows):
+    return [
+        feed
+        for row in rows
+        for feed in feed_cache.post_feeds(row["author_id"], row["group_id"])
+    ]
+
+
+def delete_posts(ids, job):
+    posts = Post.objects.filter(pk__in=ids)
+    rows = list(posts.values("author_id", "group_id", "image"))
+    search.unindex_posts(ids)
+    _delete_cascade(posts)
+    images = [row["image"] for row in rows if row["image"]]
+    transaction.on_commit(lambda: thumbnails.forget(images))
+    authors = Counter(row["author_id"] for row in rows)
+    for author_id, count in authors.items():
+        counters.change_author_stats(author_id, "posts_count", -count)
+    groups = Counter(row["group_id"] for row in rows)
+    for group_id, count in groups.items():
+        counters.change_group_posts(group_id, -count)
+    return _feeds(rows), ()
+
+
+def move_to_group(ids, job):
+    # Группу могли удалить после постановки задания (group станет NULL).
+    if not Group.objects.filter(pk=job.group_id).exists():
+        raise ValueError("Группа удалена")
+    posts = Post.objects.filter(pk__in=ids).exclude(group_id=job.group_id)
+    rows = list(posts.values("pk", "author_id", "group_id"))
+    posts.update(group_id=job.group_id)
+    for group_id, count in Counter(row["group_id"] for row in rows).items():
+        counters.change_group_posts(group_id, -count)
+    counters.change_group_posts(job.group_id, len(rows))
+    feeds = _feeds(rows) + _feeds(
+        {**row, "group_id": job.group_id} for row in rows
+    )
+    return feeds, [row["pk"] for row in rows]
+
+
+def purge_comments(ids, job):
+    posts = Post.objects.filter(pk__in=ids, comments_count__gt=0)
+    rows = list(posts.values("pk", "author_id", "group_id"))
+    search.unindex_comments_of(ids)
+    _delete_cascade(Comment.objects.filter(post_id__in=ids))
+    posts.update(comments_count=0)
+    return _feeds(rows), [row["pk"] for row in rows]
+
+
+ACTIONS = {
+    BulkJob.DELETE_POSTS: delete_posts,
+    BulkJob.MOVE_TO_GROUP: move_to_group,
+    BulkJob.PURGE_COMMENTS: purge_comments,
+}
+
+
+def stale():
+    """Условие на задания, брошенные упавшим воркером."""
+    deadline = timezone.now() - datetime.timedelta(
+        seconds=settings.BULK_JOB_TIMEOUT
+    )
+    return Q(status=BulkJob.RUNNING) & (
+        Q(heartbeat__lt=deadline) | Q(heartbeat__isnull=True)
+    )
+
+
+def claim():
+    """Забирает одно задание так, чтобы его не взял другой воркер."""
+    claimable = Q(status=BulkJob.PENDING) | stale()
+    for pk in BulkJob.objects.filter(claimable).order_by(
+        "created"
+    ).values_list("pk", flat=True)[:5]:
+        if BulkJob.objects.filter(claimable, pk=pk).update(
+            status=BulkJob.RUNNING, heartbeat=timezone.now()
+        ):
+            return BulkJob.objects.get(pk=pk)
+    return None
+
+
+def process(job):
+    """Выполняет задание пачками, начиная с уже обработанных."""
+    action = ACTIONS[job.action]
+    ids = job.ids()
+    size = settings.BULK_JOB_BATCH_SIZE
+    try:
+        for start in range(job.processed, len(ids), size):
+            batch = ids[start:start + size]
+            with transaction.atomic():
+                feeds, changed_posts = action(batch, job)
+                BulkJob.objects.filter(pk=job.pk).update(
+                    processed=F("processed") + len(batch),
+                    heartbeat=timezone.now(),
+                )
+            # Кеш правится после коммита, чтобы не отдать старые данные
+            # под новой версией.
+            feed_cache.bump(*feeds)
+            for post_id in changed_posts:
+                card_cache.invalidate_post(post_id)
+            job.processed = start + len(batch)
+            if settings.BULK_JOB_PAUSE:
+                time.sleep(settings.BULK_JOB_PAUSE)
+    except Exception as error:
+        logger.exception("Массовое действие %s прервано", job.pk)
+        job.status = BulkJob.FAILED
+        job.error = str(error)
+    else:
+        job.status = BulkJob.DONE
+        job.error = ""
+    job.finished = timezone.now()
+    job.save(update_fields=("status", "error", "finished"))
+    return job.status
+
+
+def run(poll_interval, once=False):
+    """Выполняет задания по очереди; с once=True - пока она не пуста."""
+    processed = 0
+    while True:
+        close_old_connections()
+        job = claim()
+        if job is not None:
+            process(job)
+            processed += 1
+        elif once:
+            return processed
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,82 @@
+"""Кеш отрендеренных карточек постов (includes/forter.html).
+
+Ключ карточки включает id поста и версии всего, что в ней показано:
+самого поста, его автора и группы. Лента получает все карточки
+страницы одним get_many и рендерит только отсутствующие.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core import routers
+
+from .feed_cache import bump, get_versions
+
+CARD_TEMPLATE = "includes/forter.html"
+CARD_KEY = "post-card:{}:{}:{}:{}"
+
+
+def post_version(post_id):
+    return f"card-post:{post_id}"
+
+
+def author_version(author_id):
+    return f"card-author:{author_id}"
+
+
+def group_version(group_id):
+    return f"card-group:{group_id}"
+
+
+def _depends_on(post):
+    names = [post_version(post.pk), author_version(post.author_id)]
+    if post.group_id is not None:
+        names.append(group_version(post.group_id))
+    return names
+
+
+def card_keys(posts, index):
+    """Ключи карточек страницы; версии читаются одним запросом к кешу."""
+    names = sorted({name for post in posts for name in _depends_on(post)})
+    versions = dict(zip(names, get_versions(*names)))
+    source = routers.cache_source()
+    return [
+        CARD_KEY.format(
+            source,
+            post.pk,
+            int(bool(index)),
+            ".".join(str(versions[name]) for name in _depends_on(post)),
+        )
+        for post in posts
+    ]
+
+
+def render_cards(posts, index=False):
+    """HTML карточек в порядке posts: из кеша или свежеотрендеренные."""
+    posts = list(posts)
+    keys = card_keys(posts, index)
+    cards = cache.get_many(keys)
+    missing = {}
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            missing[key] = render_to_string(
+                CARD_TEMPLATE, {"post": post, "index": index}
+            )
+    if missing:
+        cache.set_many(
+            missing, routers.cache_timeout(settings.POST_CARD_CACHE_TIMEOUT)
+        )
+        cards.update(missing)
+    return [cards[key] for key in keys]
+
+
+def invalidate_post(post_id):
+    bump(post_version(post_id))
+
+
+def invalidate_author(author_id):
+    bump(author_version(author_id))
+
+
+def invalidate_group(group_id):
+    bump(group_version(group_id))
@@ -0,0 +1,89 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def _change(queryset, field, delta):
+    """Атомарно сдвигает счетчик через F(); ниже нуля не опускает."""
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    return queryset.update(**{field: value})
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(pk=group_id), "posts_count", delta)
+
+
+def change_post_comments(post_id, delta):
+    if post_id is not None:
+        _change(Post.objects.filter(pk=post_id), "comments_count", delta)
+
+
+def change_author_stats(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if _change(stats, field, delta) or delta < 0:
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    _change(stats, field, delta)
+
+
+def _count_of(queryset, field):
+    """Подзапрос «количество строк queryset на OuterRef('pk')»."""
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def _repair(queryset, field, expression):
+    """Переписывает только разошедшиеся строки, возвращает их число."""
+    return queryset.exclude(**{field: expression}).update(
+        **{field: expression}
+    )
+
+
+def recount():
+    """Пересчитывает все денормализованные счетчики с нуля.
+
+    Возвращает словарь «счетчик: сколько строк было исправлено».
+    """
+    AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(user_id=user_id)
+            for user_id in User.objects.filter(
+                stats__isnull=True
+            ).values_list("pk", flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+    user_counts = {
+        "posts_count": _count_of(Post.objects.all(), "author"),
+        "followers_count": _count_of(Follow.objects.all(), "author"),
+        "following_count": _count_of(Follow.objects.all(), "user"),
+    }
+    fixed = {
+        "group.posts_count": _repair(
+            Group.objects.all(),
+            "posts_count",
+            _count_of(Post.objects.all(), "group"),
+        ),
+        "post.comments_count": _repair(
+            Post.objects.all(),
+            "comments_count",
+            _count_of(Comment.objects.all(), "post"),
+        ),
+    }
+    for field, expression in user_counts.items():
+        fixed[f"stats.{field}"] = _repair(
+            AuthorStats.objects.all(),
+            field,
+            expression,
+        )
+    return fixed
@@ -0,0 +1,149 @@
+"""ETag для условных GET-запросов к лентам и странице поста.
+
+Валидатор собирается из тех же версий, что и ключи кеша лент и
+карточек: любое изменение, которое сбрасывает кеш, меняет и ETag.
+Страницы зависят от того, кто их смотрит (шапка, кнопка подписки),
+поэтому в ETag входит и id пользователя, а фрагмент ленты
+(posts.fragments) отличается от полной страницы по тому же адресу.
+
+ETag ответов API (api_*) строится из тех же версий, но отличается от
+ETag страницы и учитывает путь и параметры, меняющие ответ: fields,
+limit и q.
+"""
+import hashlib
+from functools import wraps
+
+from core import routers
+
+from . import card_cache, feed_cache, fragments
+from .models import Group, Post, User
+
+
+def _viewer(request):
+    return str(request.user.pk) if request.user.is_authenticated else "-"
+
+
+def _digest(*parts):
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def _etag(request, *versions):
+    return _digest(
+        _viewer(request),
+        routers.cache_source(),
+        request.GET.get("cursor", ""),
+        "fragment" if fragments.requested(request) else "page",
+        *versions,
+    )
+
+
+def _api_fields(request):
+    """Поля из параметра fields в порядке ответа; пустой - все."""
+    return [
+        name.strip()
+        for name in request.GET.get("fields", "").split(",")
+        if name.strip()
+    ]
+
+
+def _api_variant(request):
+    # Путь различает ресурсы с общими версиями: пост и его комментарии.
+    return (
+        "api",
+        request.path,
+        ",".join(_api_fields(request)),
+        request.GET.get("limit", "").strip(),
+        Group.search_key(request.GET.get("q", "").strip()),
+    )
+
+
+def index_etag(request):
+    return _etag(
+        request,
+        *feed_cache.get_versions(
+            feed_cache.INDEX, feed_cache.GROUPS, feed_cache.AUTHORS
+        ),
+    )
+
+
+def group_posts_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "pk", flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return _etag(
+        request,
+        group_id,
+        *feed_cache.get_versions(
+            feed_cache.group_feed(group_id), feed_cache.AUTHORS
+        ),
+    )
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        "pk", flat=True
+    ).first()
+    if author_id is None:
+        return None
+    feeds = [
+        feed_cache.profile_feed(author_id),
+        feed_cache.GROUPS,
+        feed_cache.AUTHORS,
+    ]
+    if request.user.is_authenticated:
+        feeds.append(feed_cache.follows_of(request.user.pk))
+    return _etag(request, author_id, *feed_cache.get_versions(*feeds))
+
+
+def post_detail_etag(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        "author_id", "group_id"
+    ).first()
+    if post is None:
+        return None
+    versions = [
+        card_cache.post_version(post_id),
+        card_cache.author_version(post["author_id"]),
+        # Страница показывает число постов автора
+        # и имена авторов комментариев.
+        feed_cache.profile_feed(post["author_id"]),
+        feed_cache.AUTHORS,
+    ]
+    if post["group_id"] is not None:
+        versions.append(card_cache.group_version(post["group_id"]))
+    return _etag(request, post_id, *feed_cache.get_versions(*versions))
+
+
+def _for_api(etag_func):
+    """ETag ответа API по валидатору соответствующей страницы."""
+    @wraps(etag_func)
+    def api_etag(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs)
+        if etag is None:
+            return None
+        return _digest(etag, *_api_variant(request))
+    return api_etag
+
+
+api_index_etag = _for_api(index_etag)
+api_group_posts_etag = _for_api(group_posts_etag)
+api_profile_etag = _for_api(profile_etag)
+api_post_detail_etag = _for_api(post_detail_etag)
+
+
+def api_groups_etag(request):
+    """Список групп меняется с версией GROUPS.
+
+    posts_count сдвигается с каждым постом в группе, поэтому, если
+    поле есть в ответе, в ETag входит и версия INDEX.
+    """
+    feeds = [feed_cache.GROUPS]
+    fields = _api_fields(request)
+    if not fields or "posts_count" in fields:
+        feeds.append(feed_cache.INDEX)
+    return _digest(
+        _etag(request, *feed_cache.get_versions(*feeds)),
+        *_api_variant(request),
+    )
@@ -0,0 +1,75 @@
+"""Версионированный кеш фрагментов лент.
+
+Ключ фрагмента собирается из имени ленты, курсора страницы и версий
+лент, от которых зависит ее содержимое. Сигналы моделей увеличивают
+версии затронутых лент, поэтому старые фрагменты перестают
+запрашиваться сразу, а TTL можно держать большим.
+"""
+import time
+
+from django.core.cache import cache
+
+from core import routers
+
+INDEX = "index"
+GROUPS = "groups"
+AUTHORS = "authors"
+VERSION_KEY = "feed-version:{}"
+
+
+def group_feed(group_id):
+    return f"group:{group_id}"
+
+
+def profile_feed(author_id):
+    return f"profile:{author_id}"
+
+
+def follows_of(user_id):
+    """Версия подписок пользователя: от нее зависят кнопки подписки."""
+    return f"follows:{user_id}"
+
+
+def _fresh_version():
+    # Версия, созданная после вытеснения ключа, не должна совпасть
+    # ни с одной из выданных раньше.
+    return int(time.time() * 1000)
+
+
+def get_versions(*feeds):
+    """Текущие версии лент одним обращением к кешу."""
+    keys = [VERSION_KEY.format(feed) for feed in feeds]
+    versions = cache.get_many(keys)
+    missing = {
+        key: _fresh_version() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*feeds):
+    """Сдвигает версии лент, делая их закешированные страницы устаревшими."""
+    for feed in set(feeds):
+        key = VERSION_KEY.format(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def page_key(feed, cursor, *depends_on):
+    """Ключ фрагмента страницы ленты для тега {% cache %}."""
+    versions = get_versions(feed, *depends_on)
+    return ":".join((
+        routers.cache_source(), feed, cursor or "", *map(str, versions)
+    ))
+
+
+def post_feeds(author_id, group_id):
+    """Ленты, в которых показывается пост с такими автором и группой."""
+    feeds = [INDEX, profile_feed(author_id)]
+    if group_id is not None:
+        feeds.append(group_feed(group_id))
+    return feeds
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import group_choices, images
 from .models import Comment, Post
 
 
@@ -12,6 +14,18 @@ class PostForm(forms.ModelForm):
             "image",
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_lookup = group_choices.bind(self["group"])
+
+    def clean_image(self):
+        """Перекодирует новую картинку и отбрасывает ее метаданные."""
+        image = self.cleaned_data.get("image")
+        if not isinstance(image, UploadedFile):
+            return image
+        field = Post._meta.get_field("image")
+        return images.normalize(image, field.storage, field.upload_to)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
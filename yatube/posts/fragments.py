@@ -0,0 +1,33 @@
+"""Фрагменты лент для бесконечной прокрутки.
+
+С параметром ?fragment=1 или заголовком X-Fragment: 1 ленты отдают
+только карточки постов, без base.html, шапки и пагинатора, а курсор
+следующей порции - в заголовке X-Next-Cursor. Карточки берутся из
+того же кеша страниц ленты, что и полная страница.
+"""
+from django.shortcuts import render
+from django.utils.cache import patch_vary_headers
+
+PARAM = "fragment"
+HEADER = "X-Fragment"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TEMPLATE = "posts/feed_fragment.html"
+
+
+def requested(request):
+    return (
+        request.GET.get(PARAM) == "1"
+        or request.headers.get(HEADER) == "1"
+    )
+
+
+def render_feed(request, template, context, index=True):
+    """Полная страница ленты или только ее карточки."""
+    if requested(request):
+        response = render(request, TEMPLATE, {**context, "index": index})
+        response[NEXT_CURSOR_HEADER] = context["page_obj"].next_cursor or ""
+    else:
+        response = render(request, template, context)
+    # Страница и фрагмент живут по одному адресу.
+    patch_vary_headers(response, (HEADER,))
+    return response
@@ -0,0 +1,67 @@
+"""Варианты выбора группы в PostForm без чтения всей таблицы групп.
+
+ModelChoiceField на каждый показ формы выбирает все группы. Здесь
+список (id, название) лежит в кеше под версией feed_cache.GROUPS,
+которую сигналы сдвигают при правке и удалении группы, так что
+форма обходится без запросов к Group. Если групп больше
+GROUP_CHOICES_LIMIT, в <select> остается только выбранная группа,
+а остальные подгружаются поиском через api:groups (?q=).
+Проверка при отправке формы - это и так один get() по первичному
+ключу.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from core import routers
+
+from .feed_cache import GROUPS, get_versions
+from .models import Group
+
+CHOICES_KEY = "group-choices:{}:{}"
+
+
+def choices():
+    """(id, название) всех групп или None, если их больше порога."""
+    version, = get_versions(GROUPS)
+    key = CHOICES_KEY.format(routers.cache_source(), version)
+    cached = cache.get(key)
+    if cached is None:
+        limit = settings.GROUP_CHOICES_LIMIT
+        rows = list(
+            Group.objects.order_by("pk").values_list("pk", "title")[
+                :limit + 1
+            ]
+        )
+        cached = {"complete": len(rows) <= limit, "rows": rows[:limit]}
+        cache.set(
+            key,
+            cached,
+            routers.cache_timeout(settings.GROUP_CHOICES_CACHE_TIMEOUT),
+        )
+    return cached["rows"] if cached["complete"] else None
+
+
+def _selected(value):
+    if value in (None, ""):
+        return []
+    try:
+        pk = int(value)
+    except (TypeError, ValueError):
+        return []
+    return list(Group.objects.filter(pk=pk).values_list("pk", "title"))
+
+
+def bind(bound_field):
+    """Подставляет варианты в поле group формы вместо ModelChoiceIterator.
+
+    Возвращает адрес поиска групп, если список пришлось сократить.
+    """
+    field = bound_field.field
+    rows = choices()
+    lookup = None
+    if rows is None:
+        rows = _selected(bound_field.value())
+        lookup = field.widget.attrs["data-lookup"] = reverse("api:groups")
+    field.choices = [("", field.empty_label), *rows]
+    return lookup
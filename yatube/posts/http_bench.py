@@ -0,0 +1,324 @@
+"""Сквозной замер страниц posts через тестовый клиент и WSGI-сервер.
+
+Каждый сценарий - это запрос к одной view. Для него снимаются
+задержка (p50/p95/p99), число SQL-запросов и размер ответа. Тестовый
+клиент показывает стоимость самой Django, настоящий WSGI-сервер
+добавляет HTTP-разбор и сокет. Результат сохраняется в JSON, два
+таких файла можно сравнить командой bench_http --compare.
+"""
+import http.client
+import math
+import platform
+import re
+import statistics
+import threading
+import time
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+# По этой метке бенчмарк находит и удаляет созданные им записи.
+MARK = "bench_http"
+CSRF_TOKEN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу (без statistics.quantiles)."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class QueryCounter:
+    """Обертка для connection.execute_wrapper: считает запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Scenario:
+    def __init__(self, name, path, data=None):
+        self.name = name
+        self.path = path
+        self.data = data
+
+
+def scenarios():
+    """Сценарии на самых «тяжелых» объектах базы."""
+    group = Group.objects.order_by("-posts_count").first()
+    author = AuthorStats.objects.order_by("-posts_count").first()
+    post = Post.objects.order_by("-comments_count").first()
+    if not (group and author and post):
+        return None
+    return [
+        Scenario("index", reverse("posts:index")),
+        Scenario(
+            "index_fragment", reverse("posts:index") + "?fragment=1"
+        ),
+        Scenario(
+            "group_posts", reverse("posts:group_list", args=(group.slug,))
+        ),
+        Scenario(
+            "profile",
+            reverse("posts:profile", args=(author.user.username,)),
+        ),
+        Scenario(
+            "post_detail", reverse("posts:post_detail", args=(post.pk,))
+        ),
+        Scenario(
+            "post_comments",
+            reverse("posts:post_comments", args=(post.pk,)),
+        ),
+        Scenario("follow_index", reverse("posts:follow_index")),
+        # Те же данные через JSON API - для сравнения с HTML.
+        Scenario("api_posts", reverse("api:posts")),
+        Scenario(
+            "api_group_posts", reverse("api:group_posts", args=(group.slug,))
+        ),
+        Scenario(
+            "api_profile_posts",
+            reverse("api:profile_posts", args=(author.user.username,)),
+        ),
+        Scenario(
+            "api_post_comments",
+            reverse("api:post_comments", args=(post.pk,)),
+        ),
+        Scenario("api_follow", reverse("api:follow")),
+        Scenario(
+            "create_post",
+            reverse("posts:create_post"),
+            {"text": f"{MARK} пост", "group": group.pk},
+        ),
+        Scenario(
+            "add_comment",
+            reverse("posts:add_comment", args=(post.pk,)),
+            {"text": f"{MARK} комментарий"},
+        ),
+    ]
+
+
+def reader():
+    """Пользователь с самой большой лентой подписок."""
+    stats = AuthorStats.objects.select_related("user").order_by(
+        "-following_count"
+    ).first()
+    return stats and stats.user
+
+
+def cleanup():
+    """Удаляет записи бенчмарка через ORM, чтобы сработали сигналы."""
+    for post in Post.objects.filter(text__startswith=MARK):
+        post.delete()
+    for comment in Comment.objects.filter(text__startswith=MARK):
+        comment.delete()
+
+
+class ClientTransport:
+    name = "client"
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, scenario):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            if scenario.data is None:
+                response = self.client.get(scenario.path)
+            else:
+                response = self.client.post(scenario.path, scenario.data)
+        return response.status_code, counter.count, len(response.content)
+
+    def close(self):
+        pass
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class CountingApplication:
+    """WSGI-приложение Django, запоминающее число запросов к БД.
+
+    Сервер однопоточный, поэтому последнего значения достаточно.
+    """
+
+    def __init__(self):
+        self.application = WSGIHandler()
+        self.queries = 0
+
+    def __call__(self, environ, start_response):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            body = b"".join(self.application(environ, start_response))
+        self.queries = counter.count
+        return [body]
+
+
+class WSGITransport:
+    name = "wsgi"
+
+    def __init__(self, user):
+        self.application = CountingApplication()
+        self.server = make_server(
+            "127.0.0.1", 0, self.application, handler_class=QuietHandler
+        )
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        client = Client()
+        client.force_login(user)
+        self.cookies = {
+            name: morsel.value for name, morsel in client.cookies.items()
+        }
+        self.csrf_token = None
+
+    def _send(self, method, path, body=None, headers=None):
+        http_connection = http.client.HTTPConnection(
+            *self.server.server_address
+        )
+        cookie = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        http_connection.request(
+            method, path, body, {"Cookie": cookie, **(headers or {})}
+        )
+        response = http_connection.getresponse()
+        content = response.read()
+        for header in response.msg.get_all("Set-Cookie") or ():
+            name, _, rest = header.partition("=")
+            self.cookies[name] = rest.split(";", 1)[0]
+        http_connection.close()
+        return response.status, content
+
+    def _csrf(self):
+        # Настоящий сервер проверяет CSRF: токен берется из формы.
+        if self.csrf_token is None:
+            _, content = self._send("GET", reverse("posts:create_post"))
+            self.csrf_token = CSRF_TOKEN.search(content.decode()).group(1)
+        return self.csrf_token
+
+    def request(self, scenario):
+        if scenario.data is None:
+            status, content = self._send("GET", scenario.path)
+        else:
+            body = urlencode({
+                **scenario.data,
+                "csrfmiddlewaretoken": self._csrf(),
+            })
+            status, content = self._send(
+                "POST",
+                scenario.path,
+                body,
+                {"Content-Type": "application/x-www-form-urlencoded"},
+            )
+        return status, self.application.queries, len(content)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+TRANSPORTS = {
+    transport.name: transport for transport in (
+        ClientTransport, WSGITransport
+    )
+}
+
+
+def measure(transport, scenario, repeat, cold=False):
+    timings, queries, sizes, statuses = [], [], [], set()
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        status, query_count, size = transport.request(scenario)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(query_count)
+        sizes.append(size)
+        statuses.add(status)
+    return {
+        "requests": repeat,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "queries": round(statistics.mean(queries), 2),
+        "bytes": round(statistics.mean(sizes)),
+        "statuses": sorted(statuses),
+    }
+
+
+def run(user, transports, repeat, cold=False, warmup=3):
+    """Прогоняет все сценарии и возвращает отчет для JSON."""
+    report = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "repeat": repeat,
+            "cold": cold,
+            "posts": Post.objects.count(),
+            "comments": Comment.objects.count(),
+            "follows": Follow.objects.count(),
+        },
+        "results": {},
+    }
+    for name in transports:
+        transport = TRANSPORTS[name](user)
+        try:
+            results = report["results"][name] = {}
+            for scenario in scenarios():
+                for _ in range(warmup):
+                    transport.request(scenario)
+                results[scenario.name] = measure(
+                    transport, scenario, repeat, cold
+                )
+        finally:
+            transport.close()
+            # Следующий транспорт должен видеть ту же базу.
+            cleanup()
+    return report
+
+
+# Метрики, рост которых считается регрессией.
+COMPARED = ("p50_ms", "p95_ms", "p99_ms", "queries", "bytes")
+
+
+def compare(baseline, current, threshold):
+    """Строки сравнения двух отчетов и признак регрессии."""
+    lines, regressed = [], False
+    for transport, results in current["results"].items():
+        for view, stats in results.items():
+            before = baseline["results"].get(transport, {}).get(view)
+            if before is None:
+                continue
+            for metric in COMPARED:
+                old, new = before[metric], stats[metric]
+                if old:
+                    change = (new - old) / old * 100
+                else:
+                    change = math.inf if new else 0.0
+                # Время шумит, а запросы и байты должны совпадать точно.
+                limit = threshold if metric.endswith("_ms") else 0
+                worse = change > limit
+                regressed = regressed or worse
+                lines.append(
+                    f"{transport:6} {view:17} {metric:8} {old:>10} -> "
+                    f"{new:>10} ({change:+.1f}%){' !' if worse else ''}"
+                )
+    return lines, regressed
@@ -0,0 +1,83 @@
+"""Нормализация картинок, загружаемых в посты.
+
+Оригинал перекодируется один раз при загрузке: поворот по EXIF
+применяется к пикселям, сами метаданные отбрасываются, размер
+ограничивается POST_IMAGE_MAX_SIZE. Имя файла - хеш содержимого,
+поэтому одинаковые картинки хранятся в одном экземпляре.
+"""
+import hashlib
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps, features
+
+HASH_CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+
+def _flatten(image):
+    """RGB без прозрачности: JPEG не умеет альфа-канал."""
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _open(upload):
+    upload.seek(0)
+    image = Image.open(upload)
+    # JPEG можно декодировать сразу в уменьшенном масштабе и не держать
+    # в памяти полноразмерный растр.
+    image.draft("RGB", settings.POST_IMAGE_MAX_SIZE)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+    return _flatten(image)
+
+
+def _encode(image, image_format):
+    # До max_size файл живет в памяти, дальше - во временном файле.
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(
+        output,
+        image_format,
+        quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+    )
+    output.seek(0)
+    return output
+
+
+def _digest(stream):
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        sha.update(chunk)
+    stream.seek(0)
+    return sha.hexdigest()
+
+
+def normalize(upload, storage, upload_to):
+    """Перекодирует загрузку и возвращает значение для ImageField.
+
+    Если такая картинка уже лежит в хранилище, возвращается имя
+    существующего файла, и поле не запишет его повторно.
+    """
+    image = _open(upload)
+    encoded = _encode(image, settings.POST_IMAGE_FORMAT)
+    digest = _digest(encoded)
+    name = f"{digest}.{EXTENSIONS[settings.POST_IMAGE_FORMAT]}"
+    path = os.path.join(upload_to, name)
+    if settings.POST_IMAGE_WEBP_COPY and features.check("webp"):
+        webp_path = os.path.join(upload_to, f"{digest}.webp")
+        if not storage.exists(webp_path):
+            with _encode(image, "WEBP") as webp:
+                storage.save(webp_path, File(webp))
+    if storage.exists(path):
+        encoded.close()
+        return path
+    return File(encoded, name=name)
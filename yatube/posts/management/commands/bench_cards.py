@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from posts import card_cache
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    """Откатывает тестовые данные после замеров."""
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время рендера страницы карточек постов без кеша, "
+        "с холодным и с прогретым кешем карточек."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--per-page",
+            type=int,
+            default=settings.COUNT_POSTS_ON_PAGE,
+            help="Сколько карточек на странице.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Сколько раз повторять каждый замер.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.bench(options["per_page"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def bench(self, per_page, repeat):
+        posts = list(
+            Post.objects.select_related("author", "group")[:per_page]
+        )
+        if len(posts) < per_page:
+            author, _ = User.objects.get_or_create(username="bench_cards")
+            for number in range(per_page - len(posts)):
+                Post.objects.create(
+                    author=author,
+                    text=f"Пост для замера {number}\n" * 20,
+                )
+            posts = list(
+                Post.objects.select_related("author", "group")[:per_page]
+            )
+
+        def uncached():
+            for post in posts:
+                render_to_string(
+                    card_cache.CARD_TEMPLATE, {"post": post, "index": True}
+                )
+
+        def cold():
+            for post in posts:
+                card_cache.invalidate_post(post.pk)
+            card_cache.render_cards(posts, index=True)
+
+        def warm():
+            card_cache.render_cards(posts, index=True)
+
+        warm()
+        results = (
+            ("без кеша", _timed(uncached, repeat)),
+            ("холодный кеш", _timed(cold, repeat)),
+            ("прогретый кеш", _timed(warm, repeat)),
+        )
+        self.stdout.write(f"Карточек на странице: {len(posts)}")
+        for name, median in results:
+            self.stdout.write(f"{name}: {median:.2f} мс на страницу (p50)")
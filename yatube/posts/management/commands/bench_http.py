@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import http_bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет страницы posts через тестовый клиент и WSGI-сервер: "
+        "p50/p95/p99, SQL-запросы и байты на запрос. Запускать на базе, "
+        "заполненной seed_yatube."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=100,
+            help="Сколько запросов на каждый сценарий.",
+        )
+        parser.add_argument(
+            "--transport",
+            choices=sorted(http_bench.TRANSPORTS),
+            action="append",
+            help="client и/или wsgi; по умолчанию оба.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Очищать кеш перед каждым запросом.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Куда сохранить отчет в JSON.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="Отчет прошлого прогона для сравнения.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="Допустимый рост времени в процентах.",
+        )
+
+    def handle(self, *args, **options):
+        user = http_bench.reader()
+        if user is None or http_bench.scenarios() is None:
+            raise CommandError("База пуста: сначала запустите seed_yatube")
+        report = http_bench.run(
+            user,
+            options["transport"] or sorted(http_bench.TRANSPORTS),
+            options["repeat"],
+            cold=options["cold"],
+        )
+        for transport, results in report["results"].items():
+            for view, stats in results.items():
+                self.stdout.write(
+                    f"{transport:6} {view:17} "
+                    f"p50 {stats['p50_ms']:8.2f} мс  "
+                    f"p95 {stats['p95_ms']:8.2f} мс  "
+                    f"p99 {stats['p99_ms']:8.2f} мс  "
+                    f"запросов {stats['queries']:5}  "
+                    f"байт {stats['bytes']:7}  "
+                    f"статусы {stats['statuses']}"
+                )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                lines, regressed = http_bench.compare(
+                    json.load(baseline), report, options["threshold"]
+                )
+            self.stdout.write("\n".join(lines))
+            if regressed:
+                raise CommandError("Есть регрессии относительно базы")
@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+WORDS = (
+    "пост лента автор группа подписка комментарий фото город море "
+    "горы книга кино музыка кофе утро вечер работа отпуск погода "
+    "кошка собака поезд самолет дорога река лес снег солнце дождь"
+).split()
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    """Откатывает тестовые данные после замеров."""
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _text(rnd, words):
+    # Частоты слов по закону Ципфа: первые слова встречаются чаще.
+    weights = [1 / rank for rank in range(1, len(WORDS) + 1)]
+    return " ".join(rnd.choices(WORDS, weights, k=words))
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск по индексу FTS5 с поиском LIKE по тексту постов. "
+        "С --rows сначала добавляет синтетические посты (и откатывает их)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=0,
+            help="Сколько синтетических постов добавить перед замером.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Сколько раз повторять каждый замер.",
+        )
+        parser.add_argument(
+            "terms",
+            nargs="*",
+            default=("пост", "дождь", "самолет река", "вертолет"),
+            help="Поисковые запросы.",
+        )
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stderr.write("Полнотекстовый индекс есть только в SQLite")
+            return
+        try:
+            with transaction.atomic():
+                self.fill(options["rows"])
+                self.bench(options["terms"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def fill(self, rows):
+        if not rows:
+            return
+        author, _ = User.objects.get_or_create(username="bench_search")
+        rnd = random.Random(rows)
+        for start in range(0, rows, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(author=author, text=_text(rnd, rnd.randint(5, 40)))
+                for _ in range(min(BATCH_SIZE, rows - start))
+            )
+        # bulk_create не отправляет сигналы, индекс собирается целиком.
+        search.rebuild()
+
+    def bench(self, terms, repeat):
+        self.stdout.write(f"Постов: {Post.objects.count()}")
+        for term in terms:
+            words = term.split()
+
+            def like():
+                posts = Post.objects.all()
+                for word in words:
+                    posts = posts.filter(text__icontains=word)
+                return list(posts.order_by("-pub_date", "-pk")[:10])
+
+            def fts():
+                return search.search(term, limit=10)
+
+            self.stdout.write(
+                f"«{term}»: LIKE {_timed(like, repeat):.2f} мс, "
+                f"FTS5 {_timed(fts, repeat):.2f} мс (p50)"
+            )
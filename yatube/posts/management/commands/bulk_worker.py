@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import run
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер массовых действий админки: удаляет посты, переносит их "
+        "в группу и чистит комментарии пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда очередь пуста.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Разобрать очередь и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        processed = run(options["poll_interval"], once=options["once"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Выполнено заданий: {processed}")
+        )
@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.paginators import NEXT, CursorPaginator, encode_cursor
+
+# Фрагменты плана, которые означают полный проход по таблице
+# или сортировку во временной структуре.
+TEMP_BTREE = "USE TEMP B-TREE"
+AUTOMATIC_INDEX = "AUTOMATIC"
+
+SAMPLE_ID = 1
+
+
+def _feed_pages(name, queryset, date_field="pub_date", pk_field="pk"):
+    """Первая и «глубокая» страницы ленты так, как их читает view."""
+    paginator = CursorPaginator(
+        queryset, settings.COUNT_POSTS_ON_PAGE, date_field, pk_field
+    )
+    cursor = encode_cursor(NEXT, timezone.now(), SAMPLE_ID)
+    return (
+        (name, paginator.page_queryset()),
+        (f"{name} (cursor)", paginator.page_queryset(cursor)),
+    )
+
+
+def view_queries():
+    """Запросы views приложения posts, план которых нужно проверять."""
+    return (
+        *_feed_pages(
+            "index",
+            Post.objects.select_related("group", "author"),
+        ),
+        *_feed_pages(
+            "group_posts",
+            Post.objects.filter(group_id=SAMPLE_ID),
+        ),
+        *_feed_pages(
+            "profile",
+            Post.objects.filter(author_id=SAMPLE_ID).select_related("group"),
+        ),
+        (
+            "profile following",
+            Follow.objects.filter(
+                user_id=SAMPLE_ID, author_id=SAMPLE_ID
+            ).order_by(),
+        ),
+        ("post_detail", Post.objects.filter(id=SAMPLE_ID)),
+        (
+            "post_detail comments",
+            Comment.objects.filter(post_id=SAMPLE_ID),
+        ),
+        *_feed_pages(
+            "follow_index",
+            TimelineEntry.objects.filter(user_id=SAMPLE_ID).order_by(
+                "-pub_date", "-post_id"
+            ),
+            pk_field="post_id",
+        ),
+        *_feed_pages(
+            "follow_index pulled authors",
+            Post.objects.filter(author_id__in=(SAMPLE_ID, SAMPLE_ID + 1)),
+        ),
+    )
+
+
+# Посты «тяжелых» авторов читаются по нескольким author_id сразу,
+# поэтому общая сортировка идет во временной структуре. Таких авторов
+# в подписках немного: их отсекает TIMELINE_FANOUT_MAX_FOLLOWERS.
+KNOWN_PROBLEMS = {
+    "follow_index pulled authors": (TEMP_BTREE,),
+    "follow_index pulled authors (cursor)": (TEMP_BTREE,),
+}
+
+
+def plan_problems(name, plan):
+    """Строки плана с полным сканом таблицы или временной сортировкой."""
+    allowed = KNOWN_PROBLEMS.get(name, ())
+    problems = []
+    for line in plan.splitlines():
+        detail = line.split(" ", 3)[-1]
+        full_scan = detail.startswith("SCAN") and "USING" not in detail
+        bad = (
+            full_scan
+            or TEMP_BTREE in detail
+            or AUTOMATIC_INDEX in detail
+        )
+        if bad and not any(known in detail for known in allowed):
+            problems.append(detail)
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет EXPLAIN QUERY PLAN для запросов лент и страниц "
+        "постов и отмечает полные сканы и сортировки без индекса."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Завершиться с ошибкой, если найден регресс плана.",
+        )
+
+    def handle(self, *args, **options):
+        regressions = []
+        for name, queryset in view_queries():
+            plan = queryset.explain()
+            problems = plan_problems(name, plan)
+            style = self.style.ERROR if problems else self.style.SUCCESS
+            self.stdout.write(style(f"== {name}"))
+            self.stdout.write(plan)
+            regressions.extend(f"{name}: {detail}" for detail in problems)
+        if regressions and options["strict"]:
+            raise CommandError(
+                "Планы запросов без индекса:\n" + "\n".join(regressions)
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает полнотекстовый индекс постов и комментариев "
+        "(после bulk-загрузки или правок в обход сигналов)."
+    )
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stderr.write("Полнотекстовый индекс есть только в SQLite")
+            return
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс пересобран"))
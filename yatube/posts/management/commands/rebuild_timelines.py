@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает материализованные ленты подписок из таблицы Follow "
+        "(после bulk-загрузки подписок или смены порога fan-out)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "user_ids",
+            nargs="*",
+            type=int,
+            help="id пользователей; по умолчанию - все ленты.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild(options["user_ids"] or None)
+        self.stdout.write(self.style.SUCCESS("Ленты подписок пересобраны"))
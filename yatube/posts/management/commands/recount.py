@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает денормализованные счетчики постов, комментариев "
+        "и подписок и исправляет накопившиеся расхождения."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        for counter, rows in fixed.items():
+            self.stdout.write(f"{counter}: исправлено строк {rows}")
+        self.stdout.write(self.style.SUCCESS("Счетчики пересчитаны"))
@@ -0,0 +1,283 @@
+import itertools
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import counters, feed_cache, search, timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    "пост лента автор группа подписка комментарий фото город море "
+    "горы книга кино музыка кофе утро вечер работа отпуск погода "
+    "кошка собака поезд самолет дорога река лес снег солнце дождь"
+).split()
+PASSWORD = "password"
+
+
+class PowerLaw:
+    """Случайные номера 0..size-1 с вероятностью ~ 1 / (номер + 1) ** skew.
+
+    Так распределены популярность авторов, групп и постов: немногие
+    получают большую часть постов, комментариев и подписчиков. Номер
+    получается обращением функции распределения плотности x ** -skew
+    на [0.5, size + 0.5), поэтому память не зависит от size.
+    """
+
+    def __init__(self, rnd, size, skew):
+        self.rnd = rnd
+        self.size = size
+        self.power = 1 - skew
+        if abs(self.power) < 1e-9:
+            # skew = 1: функция распределения - логарифм.
+            self.power = 0
+            self.low, self.span = math.log(0.5), math.log(2 * size + 1)
+        else:
+            self.low = 0.5 ** self.power
+            self.span = (size + 0.5) ** self.power - self.low
+
+    def rank(self):
+        value = self.low + self.rnd.random() * self.span
+        x = value ** (1 / self.power) if self.power else math.exp(value)
+        return min(max(int(x + 0.5) - 1, 0), self.size - 1)
+
+    def sample(self, k):
+        return [self.rank() for _ in range(k)]
+
+
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield min(batch_size, count - start)
+
+
+@contextmanager
+def _explicit_date(field):
+    """Временно отключает auto_now_add, чтобы сохранить заданную дату."""
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, группами, постами, "
+        "комментариями и подписками для нагрузочного тестирования."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Показатель степенного закона популярности.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="За сколько дней до запуска распределены даты постов.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Строк в одном INSERT; память не зависит от объема.",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Префикс имен пользователей и slug групп.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("Нужно хотя бы два пользователя")
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(
+                f"Пользователи с префиксом {prefix} уже есть, "
+                "задайте другой --prefix"
+            )
+        self.rnd = random.Random(options["seed"])
+        self.skew = options["skew"]
+        self.batch_size = options["batch_size"]
+        self.days = options["days"]
+        with transaction.atomic():
+            users = self.stage("users", self.create_users, prefix,
+                               options["users"])
+            groups = self.stage("groups", self.create_groups, prefix,
+                                options["groups"])
+            posts = self.stage("posts", self.create_posts, users, groups,
+                               options["posts"])
+            self.stage("comments", self.create_comments, users, posts,
+                       options["comments"])
+            self.stage("follows", self.create_follows, users,
+                       options["follows"])
+            # bulk_create не отправляет сигналы: счетчики, ленты подписок
+            # и поисковый индекс собираются целиком.
+            self.stage("counters", counters.recount)
+            self.stage("timelines", timeline.rebuild)
+            self.stage("search", search.rebuild)
+        feed_cache.bump(feed_cache.INDEX, feed_cache.GROUPS)
+        for model in (User, Group, Post, Comment, Follow):
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: "
+                f"{model.objects.count()}"
+            )
+        self.stdout.write(self.style.SUCCESS("База заполнена"))
+
+    def stage(self, name, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(
+            f"{name}: {time.perf_counter() - started:.1f} с"
+        )
+        return result
+
+    def _insert(self, model, count, build):
+        """Вставляет count строк пачками; возвращает список их id.
+
+        bulk_create в SQLite не возвращает id. Id читаются обратно:
+        AUTOINCREMENT выдает новые id больше прежнего максимума, но
+        не обязательно подряд с ним - после удаления верхних строк
+        нумерация продолжается с sqlite_sequence.
+        """
+        last = model.objects.aggregate(last=Max("pk"))["last"] or 0
+        for size in _batches(count, self.batch_size):
+            model.objects.bulk_create(build(size))
+        return list(
+            model.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def _text(self, low, high):
+        return " ".join(
+            self.rnd.choices(WORDS, k=self.rnd.randint(low, high))
+        ).capitalize()
+
+    def create_users(self, prefix, count):
+        password = make_password(PASSWORD)
+        numbers = itertools.count()
+        return self._insert(User, count, lambda size: [
+            User(
+                username=f"{prefix}_{number}",
+                first_name=f"Автор {number}",
+                password=password,
+            )
+            for number in itertools.islice(numbers, size)
+        ])
+
+    def create_groups(self, prefix, count):
+        numbers = itertools.count()
+        return self._insert(Group, count, lambda size: [
+            Group(
+                title=f"Группа {number}",
+                search_title=Group.search_key(f"Группа {number}"),
+                slug=f"{prefix}-{number}",
+                description=self._text(5, 20),
+            )
+            for number in itertools.islice(numbers, size)
+        ])
+
+    def create_posts(self, users, groups, count):
+        authors = PowerLaw(self.rnd, len(users), self.skew)
+        group_ranks = groups and PowerLaw(self.rnd, len(groups), self.skew)
+        # Даты растут вместе с id и покрывают последние days дней, как
+        # у настоящей ленты, а не совпадают у всех постов.
+        end = timezone.now()
+        step = timedelta(days=self.days) / max(count, 1)
+        numbers = itertools.count()
+
+        def build(size):
+            return [
+                Post(
+                    author_id=users[author],
+                    group_id=(
+                        groups[group_ranks.sample(1)[0]]
+                        if group_ranks and self.rnd.random() < 0.7
+                        else None
+                    ),
+                    text=self._text(5, 120),
+                    pub_date=end - step * (
+                        count - number - self.rnd.random()
+                    ),
+                    # Картинок нет, ставить миниатюры в очередь незачем.
+                    thumbnails_ready=True,
+                )
+                for author, number in zip(
+                    authors.sample(size), itertools.islice(numbers, size)
+                )
+            ]
+
+        # auto_now_add заменил бы pub_date в bulk_create текущим временем.
+        with _explicit_date(Post._meta.get_field("pub_date")):
+            return self._insert(Post, count, build)
+
+    def create_comments(self, users, posts, count):
+        if not posts:
+            return []
+        authors = PowerLaw(self.rnd, len(users), self.skew)
+        post_ranks = PowerLaw(self.rnd, len(posts), self.skew)
+        return self._insert(Comment, count, lambda size: [
+            Comment(
+                post_id=posts[post],
+                author_id=users[author],
+                text=self._text(2, 30),
+            )
+            for post, author in zip(
+                post_ranks.sample(size), authors.sample(size)
+            )
+        ])
+
+    def _edges(self, users, count):
+        """Подписки пользователь за пользователем без повторов.
+
+        Число подписок у пользователя - по Парето, авторы - по степенному
+        закону, поэтому в памяти только подписки одного пользователя.
+        """
+        authors = PowerLaw(self.rnd, len(users), self.skew)
+        average = count / len(users)
+        made = 0
+        for follower in users:
+            if made >= count:
+                return
+            wanted = int(average * self.rnd.paretovariate(2) / 2)
+            wanted = min(wanted, len(users) - 1, count - made)
+            chosen = set()
+            # У популярных авторов повторы часты: попыток - с запасом,
+            # но не бесконечно.
+            for author in authors.sample(wanted * 10):
+                if len(chosen) == wanted:
+                    break
+                if users[author] != follower:
+                    chosen.add(users[author])
+            made += len(chosen)
+            for author in chosen:
+                yield Follow(user_id=follower, author_id=author)
+
+    def create_follows(self, users, count):
+        edges = self._edges(users, count)
+        for size in _batches(count, self.batch_size):
+            batch = list(itertools.islice(edges, size))
+            if not batch:
+                break
+            Follow.objects.bulk_create(batch)
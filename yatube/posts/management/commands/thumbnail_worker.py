@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import run
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер очереди миниатюр: заранее готовит миниатюры картинок "
+        "новых и отредактированных постов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.THUMBNAIL_WORKER_THREADS,
+            help="Размер пула потоков.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Сколько заданий забирать из очереди за раз.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда очередь пуста.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Разобрать очередь и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        processed = run(
+            options["threads"],
+            options["batch_size"],
+            options["poll_interval"],
+            once=options["once"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Обработано заданий: {processed}")
+        )
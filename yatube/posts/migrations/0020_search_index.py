@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:05
+
+from django.db import migrations
+
+# Таблица и формат rowid описаны в posts/search.py.
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5("
+    "text, tokenize = 'unicode61 remove_diacritics 2')"
+)
+FILL_INDEX = (
+    "INSERT INTO posts_search (rowid, text) "
+    "SELECT id * 2, text FROM posts_post "
+    "UNION ALL SELECT id * 2 + 1, text FROM posts_comment"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(FILL_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_thumbnail_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -4,7 +4,32 @@ from django.db import models
 User = get_user_model()
 
 
-class Post(models.Model):
+class ConcurrentFieldsMixin:
+    """UPDATE из save() не пишет поля concurrent_fields.
+
+    Эти поля меняют через update() другие участники: счетчики сдвигают
+    через F() сигналы posts.counters, thumbnails_ready ставит воркер
+    миниатюр. Запись всей строки вернула бы в них значение, прочитанное
+    до чужих изменений. Поле из явного update_fields пишется как
+    обычно, а INSERT (в том числе строки, удаленной в другом месте)
+    записывает все поля.
+    """
+
+    concurrent_fields = ()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        values = [
+            value for value in values
+            if value[0].name not in self.concurrent_fields
+            or (update_fields and value[0].name in update_fields)
+        ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update
+        )
+
+
+class Post(ConcurrentFieldsMixin, models.Model):
     text = models.TextField(
         verbose_name="Текст",
         help_text="Введите текст поста",
@@ -35,24 +60,70 @@ class Post(models.Model):
         blank=True,
         help_text="Загрузить изображение",
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество комментариев",
+    )
+    thumbnails_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Миниатюры готовы",
+    )
+
+    concurrent_fields = ("comments_count", "thumbnails_ready")
 
     class Meta:
         ordering = ("-pub_date",)
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "-id"),
+                name="post_feed_idx",
+            ),
+            models.Index(
+                fields=("author", "-pub_date", "-id"),
+                name="post_author_feed_idx",
+            ),
+            models.Index(
+                fields=("group", "-pub_date", "-id"),
+                name="post_group_feed_idx",
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
 
-class Group(models.Model):
+class Group(ConcurrentFieldsMixin, models.Model):
     title = models.CharField(max_length=200, verbose_name="Название группы")
     slug = models.SlugField(unique=True, verbose_name="URL-адрес")
     description = models.TextField(max_length=500, verbose_name="Описание")
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество постов",
+    )
+    # Название в нижнем регистре для поиска по началу (api:groups):
+    # LIKE в SQLite не различает регистр только у латиницы.
+    search_title = models.CharField(
+        max_length=200,
+        default="",
+        editable=False,
+        db_index=True,
+        verbose_name="Название для поиска",
+    )
+
+    concurrent_fields = ("posts_count",)
 
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def search_key(text):
+        return text.lower()
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -81,6 +152,17 @@ class Comment(models.Model):
         ordering = ("-created",)
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = (
+            models.Index(
+                fields=("post", "-created", "-id"),
+                name="comment_post_feed_idx",
+            ),
+            # Сортировка и дата-иерархия changelist админки.
+            models.Index(
+                fields=("-created", "-id"),
+                name="comment_created_idx",
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -108,8 +190,251 @@ class Follow(models.Model):
         ordering = ("-pub_date",)
         verbose_name = "Подписаться на автора"
         verbose_name_plural = "Подписки"
+        indexes = (
+            models.Index(
+                fields=("user", "author"),
+                name="follow_user_author_idx",
+            ),
+            # Сортировка и дата-иерархия changelist админки.
+            models.Index(
+                fields=("-pub_date", "-id"),
+                name="follow_pub_date_idx",
+            ),
+        )
         models.UniqueConstraint(fields=["user", "author"], name="following")
 
     def __str__(self):
         return (f"Подписка {self.user.get_username}; "
                 f"на {self.author.get_username}.")
+
+
+class AuthorStats(models.Model):
+    """Счетчики пользователя, которые поддерживают сигналы posts."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество постов",
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество подписчиков",
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество подписок",
+    )
+
+    class Meta:
+        verbose_name = "Счетчики автора"
+        verbose_name_plural = "Счетчики авторов"
+
+    def __str__(self):
+        return f"Счетчики {self.user_id}"
+
+    @classmethod
+    def of(cls, user):
+        """Счетчики пользователя; без строки в таблице - нулевые."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Подписчик",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты подписок"
+        verbose_name_plural = "Ленты подписок"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "post"),
+                name="timeline_unique_post",
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=("user", "-pub_date", "-post"),
+                name="timeline_feed_idx",
+            ),
+            models.Index(
+                fields=("user", "author"),
+                name="timeline_user_author_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"Пост {self.post_id} в ленте {self.user_id}"
+
+
+class ThumbnailJob(models.Model):
+    """Задание очереди на подготовку миниатюр картинки поста."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="thumbnail_jobs",
+        verbose_name="Пост",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Попыток",
+    )
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата постановки в очередь",
+    )
+    started = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Начало последней попытки",
+    )
+
+    class Meta:
+        ordering = ("created",)
+        verbose_name = "Задание на миниатюры"
+        verbose_name_plural = "Очередь миниатюр"
+        indexes = (
+            models.Index(
+                fields=("status", "created"),
+                name="thumbnail_job_queue_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"Миниатюры поста {self.post_id}: {self.status}"
+
+
+class BulkJob(models.Model):
+    """Массовое действие админки над постами, выполняемое пачками."""
+
+    DELETE_POSTS = "delete_posts"
+    MOVE_TO_GROUP = "move_to_group"
+    PURGE_COMMENTS = "purge_comments"
+    ACTIONS = (
+        (DELETE_POSTS, "Удаление постов"),
+        (MOVE_TO_GROUP, "Перенос в группу"),
+        (PURGE_COMMENTS, "Удаление комментариев"),
+    )
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    )
+
+    action = models.CharField(
+        max_length=20,
+        choices=ACTIONS,
+        verbose_name="Действие",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name="Статус",
+    )
+    # id постов через запятую, в порядке обработки.
+    post_ids = models.TextField(verbose_name="Посты")
+    group = models.ForeignKey(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        verbose_name="Группа",
+    )
+    total = models.PositiveIntegerField(verbose_name="Всего постов")
+    processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Обработано",
+    )
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_by = models.ForeignKey(
+        User,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        verbose_name="Запустил",
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата постановки в очередь",
+    )
+    heartbeat = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Последняя пачка",
+    )
+    finished = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Дата завершения",
+    )
+
+    class Meta:
+        ordering = ("-created",)
+        verbose_name = "Массовое действие"
+        verbose_name_plural = "Массовые действия"
+        indexes = (
+            models.Index(
+                fields=("status", "created"),
+                name="bulk_job_queue_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.get_action_display()}: {self.processed}/{self.total}"
+
+    def ids(self):
+        return [int(pk) for pk in self.post_ids.split(",") if pk]
@@ -0,0 +1,118 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = "n"
+PREVIOUS = "p"
+SEPARATOR = "|"
+
+
+def encode_cursor(direction, date, pk):
+    """Упаковывает позицию (дата, id) в непрозрачную строку для URL."""
+    raw = SEPARATOR.join((direction, date.isoformat(), str(pk)))
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; для битого или пустого курсора вернет None."""
+    if not cursor:
+        return None
+    try:
+        direction, date, pk = force_str(
+            urlsafe_base64_decode(cursor)
+        ).split(SEPARATOR)
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or date is None:
+        return None
+    return direction, date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (date_field, id) от новых к старым.
+
+    В отличие от Paginator не выполняет ни COUNT(*), ни OFFSET:
+    каждая страница - это диапазонное чтение по индексу, поэтому
+    время ответа не зависит от глубины страницы и размера таблицы.
+    Вместо номеров страниц отдает курсоры next_cursor/previous_cursor.
+    """
+
+    def __init__(
+        self, object_list, per_page, date_field="pub_date", pk_field="pk"
+    ):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.pk_field = pk_field
+
+    def _after(self, date, pk):
+        # Условие на границу даты вынесено отдельно, чтобы SQLite мог
+        # начать чтение индекса прямо с позиции курсора.
+        return Q(**{f"{self.date_field}__lte": date}) & (
+            Q(**{f"{self.date_field}__lt": date})
+            | Q(**{f"{self.pk_field}__lt": pk})
+        )
+
+    def _before(self, date, pk):
+        return Q(**{f"{self.date_field}__gte": date}) & (
+            Q(**{f"{self.date_field}__gt": date})
+            | Q(**{f"{self.pk_field}__gt": pk})
+        )
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(
+            direction, getattr(obj, self.date_field), obj.pk
+        )
+
+    def page_queryset(self, cursor=None, queryset=None):
+        """Запрос одной страницы с лишней строкой для проверки соседней."""
+        position = decode_cursor(cursor)
+        if queryset is None:
+            queryset = self.object_list
+        newest_first = (f"-{self.date_field}", f"-{self.pk_field}")
+        if position is None:
+            queryset = queryset.order_by(*newest_first)
+        elif position[0] == NEXT:
+            queryset = queryset.filter(
+                self._after(*position[1:])
+            ).order_by(*newest_first)
+        else:
+            queryset = queryset.filter(
+                self._before(*position[1:])
+            ).order_by(self.date_field, self.pk_field)
+        return queryset[:self.per_page + 1]
+
+    def page_rows(self, cursor=None):
+        """Объекты страницы в порядке чтения запроса (до разворота)."""
+        return list(self.page_queryset(cursor))
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу после/до курсора; без курсора - первую."""
+        position = decode_cursor(cursor)
+        rows = self.page_rows(cursor)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if position is None:
+            cursor = None
+            has_next, has_previous = has_more, False
+        elif position[0] == NEXT:
+            has_next, has_previous = has_more, True
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        page = Page(rows, 1, self)
+        page.cursor = cursor or ""
+        page.next_cursor = (
+            self._cursor(NEXT, rows[-1]) if rows and has_next else None
+        )
+        page.previous_cursor = (
+            self._cursor(PREVIOUS, rows[0])
+            if rows and has_previous else None
+        )
+        page.has_other_cursors = bool(
+            page.next_cursor or page.previous_cursor
+        )
+        return page
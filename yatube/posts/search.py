@@ -0,0 +1,204 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Тексты постов и комментариев лежат в одной виртуальной таблице
+posts_search. rowid кодирует тип и id объекта (id * 2 для поста,
+id * 2 + 1 для комментария), поэтому обновление и удаление строки
+индекса - это поиск по первичному ключу.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.encoding import force_bytes, force_str
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+
+TABLE = "posts_search"
+POST, COMMENT = 0, 1
+# Маркеры совпадений в snippet(); заменяются на <mark> после escape().
+MARK_START, MARK_END = "\x02", "\x03"
+SNIPPET_TOKENS = 16
+WORD = re.compile(r"\w+")
+
+
+def enabled():
+    return connection.vendor == "sqlite"
+
+
+def _rowid(kind, pk):
+    return pk * 2 + kind
+
+
+def match_expression(query):
+    """Запрос пользователя как безопасное выражение MATCH: все слова
+    обязательны, последнее ищется по префиксу."""
+    words = WORD.findall(query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _write(kind, pk, text):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [_rowid(kind, pk)]
+        )
+        if text is not None:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)",
+                [_rowid(kind, pk), text],
+            )
+
+
+def index_post(post):
+    if enabled():
+        _write(POST, post.pk, post.text)
+
+
+def index_comment(comment):
+    if enabled():
+        _write(COMMENT, comment.pk, comment.text)
+
+
+def unindex_post(pk):
+    if enabled():
+        _write(POST, pk, None)
+
+
+def unindex_comment(pk):
+    if enabled():
+        _write(COMMENT, pk, None)
+
+
+def unindex_posts(pks):
+    """Убирает из индекса пачку постов вместе с их комментариями."""
+    if not enabled() or not pks:
+        return
+    placeholders = ", ".join(["%s"] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})",
+            [_rowid(POST, pk) for pk in pks],
+        )
+    unindex_comments_of(pks)
+
+
+def unindex_comments_of(post_pks):
+    """Убирает из индекса все комментарии пачки постов."""
+    if not enabled() or not post_pks:
+        return
+    placeholders = ", ".join(["%s"] * len(post_pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid IN ("
+            f"SELECT id * 2 + {COMMENT} FROM {Comment._meta.db_table} "
+            f"WHERE post_id IN ({placeholders}))",
+            post_pks,
+        )
+
+
+def rebuild():
+    """Заполняет индекс заново из таблиц постов и комментариев."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, text) "
+            f"SELECT id * 2 + {POST}, text FROM {Post._meta.db_table}"
+        )
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, text) "
+            f"SELECT id * 2 + {COMMENT}, text FROM {Comment._meta.db_table}"
+        )
+
+
+def matching_ids(query, kind):
+    """Подзапрос id постов или комментариев, подходящих под запрос.
+
+    Используется в админке: queryset.filter(pk__in=matching_ids(...)).
+    """
+    return RawSQL(
+        f"SELECT rowid / 2 FROM {TABLE} "
+        f"WHERE {TABLE} MATCH %s AND rowid %% 2 = %s",
+        [match_expression(query) or '""', kind],
+    )
+
+
+def encode_cursor(rank, rowid):
+    return urlsafe_base64_encode(force_bytes(f"{rank!r}|{rowid}"))
+
+
+def decode_cursor(cursor):
+    try:
+        rank, rowid = force_str(urlsafe_base64_decode(cursor)).split("|")
+        return float(rank), int(rowid)
+    except (TypeError, ValueError):
+        return None
+
+
+def _snippet(raw):
+    return mark_safe(
+        escape(raw)
+        .replace(MARK_START, "<mark>")
+        .replace(MARK_END, "</mark>")
+    )
+
+
+class Hit:
+    """Найденный пост или комментарий с подсветкой совпадения."""
+
+    def __init__(self, kind, obj, snippet):
+        self.kind = kind
+        self.obj = obj
+        self.snippet = snippet
+        self.post = obj if kind == POST else obj.post
+
+    @property
+    def is_comment(self):
+        return self.kind == COMMENT
+
+
+def search(query, cursor=None, limit=10):
+    """Страница результатов по bm25 и курсор следующей страницы."""
+    expression = match_expression(query)
+    if expression is None or not enabled():
+        return [], None
+    sql = (
+        f"SELECT rowid, rank, snippet({TABLE}, 0, %s, %s, '…', %s) "
+        f"FROM {TABLE} WHERE {TABLE} MATCH %s"
+    )
+    params = [MARK_START, MARK_END, SNIPPET_TOKENS, expression]
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        sql += " AND (rank > %s OR (rank = %s AND rowid > %s))"
+        params += [position[0], position[0], position[1]]
+    sql += " ORDER BY rank, rowid LIMIT %s"
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    posts = Post.objects.select_related("author", "group").in_bulk(
+        [rowid // 2 for rowid, _, _ in rows if rowid % 2 == POST]
+    )
+    comments = Comment.objects.select_related(
+        "author", "post__author"
+    ).in_bulk(
+        [rowid // 2 for rowid, _, _ in rows if rowid % 2 == COMMENT]
+    )
+    hits = []
+    for rowid, _, snippet in rows:
+        kind, pk = rowid % 2, rowid // 2
+        obj = (posts if kind == POST else comments).get(pk)
+        if obj is not None:
+            hits.append(Hit(kind, obj, _snippet(snippet)))
+    return hits, next_cursor
@@ -0,0 +1,243 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (card_cache, counters, feed_cache, search, thumbnails,
+               timeline)
+from .models import Comment, Follow, Group, Post, User
+
+TRACKED_POST_FIELDS = ("author_id", "group_id", "image")
+# Поля пользователя, которые видны в карточке поста.
+CARD_USER_FIELDS = {"username", "first_name", "last_name"}
+
+
+@receiver(post_init, sender=Post)
+def remember_post_relations(sender, instance, **kwargs):
+    """Запоминает автора, группу и картинку, чтобы заметить их смену.
+
+    Отложенные через only()/defer() поля не запоминаются: их прежнее
+    значение дочитывает load_deferred_relations перед сохранением.
+    """
+    deferred = instance.get_deferred_fields()
+    instance._loaded_relations = {
+        field: instance.__dict__.get(field)
+        for field in TRACKED_POST_FIELDS
+        if field not in deferred
+    }
+
+
+def _loaded_relations(instance, created):
+    if created:
+        return dict.fromkeys(TRACKED_POST_FIELDS)
+    return getattr(instance, "_loaded_relations", {})
+
+
+def _image_name(image):
+    return getattr(image, "name", image) or ""
+
+
+def _image_changed(loaded, instance):
+    return _image_name(loaded.get("image")) != _image_name(instance.image)
+
+
+@receiver(pre_save, sender=Post)
+def load_deferred_relations(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_relations", None)
+    if instance.pk is None or loaded is None:
+        return
+    missing = [field for field in TRACKED_POST_FIELDS if field not in loaded]
+    if missing:
+        loaded.update(
+            Post.objects.filter(pk=instance.pk).values(*missing).first()
+            or dict.fromkeys(missing)
+        )
+
+
+@receiver(pre_save, sender=Post)
+def reset_thumbnails(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_relations", {})
+    if instance.pk is None or _image_changed(loaded, instance):
+        # Без очереди миниатюры создает шаблон при первом показе.
+        instance.thumbnails_ready = not settings.THUMBNAIL_QUEUE
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = _loaded_relations(instance, created)
+    if loaded.get("author_id") != instance.author_id:
+        if loaded.get("author_id") is not None:
+            counters.change_author_stats(
+                loaded["author_id"], "posts_count", -1
+            )
+        counters.change_author_stats(instance.author_id, "posts_count", 1)
+    if loaded.get("group_id") != instance.group_id:
+        counters.change_group_posts(loaded.get("group_id"), -1)
+        counters.change_group_posts(instance.group_id, 1)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, created, **kwargs):
+    feeds = feed_cache.post_feeds(instance.author_id, instance.group_id)
+    loaded = _loaded_relations(instance, created)
+    if loaded.get("author_id") is not None:
+        feeds += feed_cache.post_feeds(
+            loaded["author_id"], loaded.get("group_id")
+        )
+    feed_cache.bump(*feeds)
+    if not created:
+        card_cache.invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def enqueue_thumbnails(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and _image_changed(
+        _loaded_relations(instance, created), instance
+    ):
+        # Обычный save() не пишет thumbnails_ready (его ведет воркер),
+        # поэтому сброс флага для новой картинки записывается отдельно.
+        Post.objects.filter(pk=instance.pk).update(
+            thumbnails_ready=instance.thumbnails_ready
+        )
+    if instance.image and not instance.thumbnails_ready:
+        thumbnails.enqueue(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def reset_post_relations(sender, instance, **kwargs):
+    remember_post_relations(sender, instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, "posts_count", -1)
+    counters.change_group_posts(instance.group_id, -1)
+    feed_cache.bump(
+        *feed_cache.post_feeds(instance.author_id, instance.group_id)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def forget_thumbnails(sender, instance, **kwargs):
+    name = _image_name(instance.image)
+    if name:
+        transaction.on_commit(lambda: thumbnails.forget([name]))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, **kwargs):
+    # Карточка поста в ленте показывает число комментариев.
+    post = Post.objects.filter(pk=instance.post_id).values(
+        "author_id", "group_id"
+    ).first()
+    if post is not None:
+        feed_cache.bump(
+            *feed_cache.post_feeds(post["author_id"], post["group_id"])
+        )
+        card_cache.invalidate_post(instance.post_id)
+
+
+@receiver(pre_save, sender=Group)
+def set_group_search_title(sender, instance, **kwargs):
+    instance.search_title = Group.search_key(instance.title)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.GROUPS, feed_cache.group_feed(instance.pk))
+    card_cache.invalidate_group(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields=None,
+                      **kwargs):
+    if created:
+        return
+    if update_fields is not None and not CARD_USER_FIELDS & update_fields:
+        return
+    card_cache.invalidate_author(instance.pk)
+    feed_cache.bump(feed_cache.AUTHORS)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author_stats(
+            instance.author_id, "followers_count", 1
+        )
+        counters.change_author_stats(instance.user_id, "following_count", 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, "followers_count", -1)
+    counters.change_author_stats(instance.user_id, "following_count", -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def restore_fan_out(sender, instance, **kwargs):
+    # После count_deleted_follow: счетчик уже уменьшен.
+    timeline.restore_fan_out(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follows(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.follows_of(instance.user_id))
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.card_cache import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, index=False):
+    """Отрендеренные карточки постов ленты, взятые через кеш."""
+    return [mark_safe(card) for card in render_cards(posts, index)]
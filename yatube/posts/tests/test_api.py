@@ -0,0 +1,145 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    """JSON API: поля, курсоры и условные GET"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(5):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f"Пост {number}"
+            )
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f"Коммент {number}"
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_post_lists(self):
+        urls = (
+            reverse("api:posts"),
+            reverse("api:group_posts", args=(self.group.slug,)),
+            reverse("api:profile_posts", args=(self.author.username,)),
+            reverse("api:follow"),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response["Content-Type"], "application/json")
+                data = response.json()
+                self.assertEqual(len(data["results"]), 5)
+                self.assertEqual(data["results"][0], {
+                    "id": self.post.pk,
+                    "text": "Пост 4",
+                    "pub_date": data["results"][0]["pub_date"],
+                    "author": "author",
+                    "group": "group",
+                    "image": None,
+                    "comments_count": 3,
+                })
+                self.assertIsNone(data["next"])
+
+    @override_settings(API_PAGE_SIZE=2)
+    def test_cursor_pagination(self):
+        for url in (reverse("api:posts"), reverse("api:follow")):
+            with self.subTest(url=url):
+                seen, cursor = [], None
+                while True:
+                    data = self.client.get(
+                        url, {"cursor": cursor or "", "fields": "id"}
+                    ).json()
+                    seen += [item["id"] for item in data["results"]]
+                    cursor = data["next"]
+                    if cursor is None:
+                        break
+                self.assertEqual(
+                    seen,
+                    list(Post.objects.order_by("-pub_date", "-id")
+                         .values_list("id", flat=True)),
+                )
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            reverse("api:posts"), {"fields": "text,author", "limit": 1}
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [{"text": "Пост 4", "author": "author"}],
+        )
+        response = self.client.get(reverse("api:posts"), {"fields": "nope"})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_comments_groups_and_post(self):
+        comments = self.client.get(
+            reverse("api:post_comments", args=(self.post.pk,)),
+            {"fields": "text"},
+        ).json()["results"]
+        self.assertEqual(comments[0], {"text": "Коммент 2"})
+        groups = self.client.get(reverse("api:groups")).json()
+        self.assertEqual(groups["results"][0]["posts_count"], 5)
+        post = self.client.get(
+            reverse("api:post", args=(self.post.pk,)), {"fields": "id"}
+        ).json()
+        self.assertEqual(post, {"id": self.post.pk})
+        response = self.client.get(reverse("api:post", args=(0,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_not_modified_until_changed(self):
+        url = reverse("api:posts")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text="Новый пост")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_representation(self):
+        url = reverse("api:posts")
+        etag = self.client.get(url, {"fields": "id"})["ETag"]
+        for path, params in (
+            (url, {"fields": "id,text"}),
+            (url, {"fields": "id", "limit": "1"}),
+            (reverse("posts:index"), {"fields": "id"}),
+            (reverse("api:groups"), {"fields": "id"}),
+        ):
+            with self.subTest(path=path, params=params):
+                response = self.client.get(
+                    path, params, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_groups_etag_follows_search_and_groups(self):
+        url = reverse("api:groups")
+        params = {"fields": "id,title", "q": "груп"}
+        etag = self.client.get(url, params)["ETag"]
+        response = self.client.get(
+            url, {**params, "q": "друг"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        Post.objects.create(author=self.author, text="Новый пост")
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Group.objects.create(title="Группа 2", slug="group-2")
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_requires_login(self):
+        response = Client().get(reverse("api:follow"))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
@@ -0,0 +1,194 @@
+import datetime
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import bulk, search
+
+from ..models import (AuthorStats, BulkJob, Comment, Follow, Group, Post,
+                      TimelineEntry, User)
+
+
+@override_settings(BULK_JOB_BATCH_SIZE=3, BULK_JOB_PAUSE=0)
+class BulkJobTests(TestCase):
+    """Массовые действия админки выполняются пачками в фоне"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.old_group = Group.objects.create(title="Старая", slug="old")
+        cls.new_group = Group.objects.create(title="Новая", slug="new")
+        for number in range(7):
+            post = Post.objects.create(
+                author=cls.author,
+                group=cls.old_group,
+                text=f"Спам номер {number}",
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f"Ответ {number}"
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def run_jobs(self):
+        call_command("bulk_worker", "--once", stdout=StringIO())
+
+    def post_action(self, action, data=None, select_across=False):
+        ids = list(Post.objects.values_list("pk", flat=True)[:2])
+        return self.client.post(reverse("admin:posts_post_changelist"), {
+            "action": action,
+            "select_across": "1" if select_across else "0",
+            helpers.ACTION_CHECKBOX_NAME: ids,
+            **(data or {}),
+        })
+
+    def test_confirmation_then_job(self):
+        response = self.post_action("delete_posts", select_across=True)
+        self.assertContains(response, "Выбрано постов: 7")
+        self.assertFalse(BulkJob.objects.exists())
+        self.post_action(
+            "delete_posts", {"apply": "yes"}, select_across=True
+        )
+        job = BulkJob.objects.get()
+        self.assertEqual((job.total, job.status), (7, BulkJob.PENDING))
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.processed, job.status), (7, BulkJob.DONE))
+
+    def test_delete_posts(self):
+        bulk.enqueue(BulkJob.DELETE_POSTS, Post.objects.all())
+        self.run_jobs()
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(AuthorStats.objects.get(user=self.author)
+                         .posts_count, 0)
+        self.old_group.refresh_from_db()
+        self.assertEqual(self.old_group.posts_count, 0)
+        if search.enabled():
+            self.assertEqual(search.search("спам")[0], [])
+            self.assertEqual(search.search("ответ")[0], [])
+
+    def test_delete_posts_covers_every_relation(self):
+        """Пачка удаляет или обнуляет все, что ссылается на посты"""
+        ids = list(Post.objects.values_list("pk", flat=True))
+        bulk.enqueue(BulkJob.DELETE_POSTS, Post.objects.all())
+        self.run_jobs()
+        for relation in Post._meta.related_objects:
+            with self.subTest(relation=relation):
+                self.assertFalse(
+                    relation.related_model._base_manager.filter(
+                        **{f"{relation.field.name}__in": ids}
+                    ).exists()
+                )
+
+    def test_deleted_group_keeps_job(self):
+        job = bulk.enqueue(
+            BulkJob.MOVE_TO_GROUP, Post.objects.all(), group=self.new_group
+        )
+        Group.objects.filter(pk=self.new_group.pk).delete()
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertIsNone(job.group)
+        self.assertEqual(job.status, BulkJob.FAILED)
+        self.assertEqual(
+            Post.objects.filter(group=self.old_group).count(), 7
+        )
+
+    def test_move_to_group(self):
+        self.post_action(
+            "move_to_group",
+            {"apply": "yes", "group": self.new_group.pk},
+            select_across=True,
+        )
+        self.run_jobs()
+        self.assertEqual(
+            Post.objects.filter(group=self.new_group).count(), 7
+        )
+        self.old_group.refresh_from_db()
+        self.new_group.refresh_from_db()
+        self.assertEqual(
+            (self.old_group.posts_count, self.new_group.posts_count), (0, 7)
+        )
+        response = self.client.get(
+            reverse("posts:group_list", args=(self.new_group.slug,))
+        )
+        self.assertContains(response, "Спам номер 6")
+
+    def test_purge_comments(self):
+        bulk.enqueue(BulkJob.PURGE_COMMENTS, Post.objects.all())
+        self.run_jobs()
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Post.objects.filter(comments_count__gt=0).exists())
+        self.assertEqual(Post.objects.count(), 7)
+
+    def test_failed_job_resumes(self):
+        job = bulk.enqueue(BulkJob.PURGE_COMMENTS, Post.objects.all())
+        BulkJob.objects.filter(pk=job.pk).update(
+            status=BulkJob.FAILED, processed=3
+        )
+        self.client.post(reverse("admin:posts_bulkjob_changelist"), {
+            "action": "retry",
+            helpers.ACTION_CHECKBOX_NAME: [job.pk],
+        })
+        self.run_jobs()
+        # Первая пачка считается выполненной и не повторяется.
+        self.assertEqual(Comment.objects.count(), 3)
+        job.refresh_from_db()
+        self.assertEqual((job.processed, job.status), (7, BulkJob.DONE))
+
+    def test_move_form_uses_autocomplete(self):
+        response = self.post_action("move_to_group", select_across=True)
+        self.assertContains(response, "admin-autocomplete")
+        self.assertContains(
+            response, reverse("admin:posts_group_autocomplete")
+        )
+        self.assertNotContains(response, self.new_group.title)
+
+    def test_stale_running_job_is_resumed(self):
+        job = bulk.enqueue(BulkJob.PURGE_COMMENTS, Post.objects.all())
+        stale = timezone.now() - datetime.timedelta(
+            seconds=settings.BULK_JOB_TIMEOUT + 1
+        )
+        BulkJob.objects.filter(pk=job.pk).update(
+            status=BulkJob.RUNNING, processed=3, heartbeat=stale
+        )
+        self.run_jobs()
+        self.assertEqual(Comment.objects.count(), 3)
+        job.refresh_from_db()
+        self.assertEqual((job.processed, job.status), (7, BulkJob.DONE))
+
+    def test_live_running_job_is_left_alone(self):
+        job = bulk.enqueue(BulkJob.PURGE_COMMENTS, Post.objects.all())
+        BulkJob.objects.filter(pk=job.pk).update(
+            status=BulkJob.RUNNING, heartbeat=timezone.now()
+        )
+        self.assertIsNone(bulk.claim())
+        self.client.post(reverse("admin:posts_bulkjob_changelist"), {
+            "action": "retry",
+            helpers.ACTION_CHECKBOX_NAME: [job.pk],
+        })
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.RUNNING)
+        BulkJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - datetime.timedelta(days=1)
+        )
+        self.client.post(reverse("admin:posts_bulkjob_changelist"), {
+            "action": "retry",
+            helpers.ACTION_CHECKBOX_NAME: [job.pk],
+        })
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.PENDING)
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import http_bench, search
+from posts.counters import recount
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+class ExplainFeedsCommandTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читаются по индексам без полных сканов"""
+        out = StringIO()
+        call_command("explain_feeds", "--strict", stdout=out)
+        self.assertIn("post_feed_idx", out.getvalue())
+        self.assertIn("post_group_feed_idx", out.getvalue())
+        self.assertIn("post_author_feed_idx", out.getvalue())
+
+
+class SeedCommandTests(TestCase):
+    def test_seed_fills_derived_data(self):
+        """seed_yatube заполняет счетчики, ленты и индекс без сигналов"""
+        call_command(
+            "seed_yatube",
+            users=30,
+            groups=3,
+            posts=200,
+            comments=300,
+            follows=60,
+            batch_size=50,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(
+            Follow.objects.filter(user_id=models.F("author_id")).exists()
+        )
+        self.assertEqual(
+            set(recount().values()), {0}, "счетчики разошлись"
+        )
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count(),
+        )
+        hits, _ = search.search(Post.objects.first().text.split()[0])
+        self.assertTrue(hits)
+
+    def test_ids_after_deleted_top_rows(self):
+        """Id новых строк читаются из базы, а не вычисляются"""
+        user = User.objects.create_user(username="gone")
+        Post.objects.create(author=user, text="Удаленный")
+        user.delete()
+        call_command(
+            "seed_yatube", users=10, groups=2, posts=30, comments=40,
+            follows=10, stdout=StringIO(),
+        )
+        self.assertEqual(
+            Post.objects.filter(author__username__startswith="seed_").count(),
+            30,
+        )
+        self.assertEqual(
+            Comment.objects.filter(
+                post__in=Post.objects.all(),
+                author__username__startswith="seed_",
+            ).count(),
+            40,
+        )
+
+    def test_power_law_skew(self):
+        """Большая часть постов приходится на немногих авторов"""
+        call_command(
+            "seed_yatube", users=100, posts=1000, comments=0, follows=0,
+            stdout=StringIO(),
+        )
+        counts = sorted(
+            User.objects.annotate(total=models.Count("posts")).values_list(
+                "total", flat=True
+            ),
+            reverse=True,
+        )
+        self.assertGreater(sum(counts[:10]), sum(counts) / 2)
+
+    def test_post_dates_spread_over_days(self):
+        """Даты постов растут с id и покрывают последние days дней"""
+        call_command(
+            "seed_yatube", users=10, posts=100, comments=0, follows=0,
+            days=30, stdout=StringIO(),
+        )
+        dates = list(Post.objects.order_by("pk").values_list(
+            "pub_date", flat=True
+        ))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreater(dates[-1] - dates[0], timedelta(days=29))
+        self.assertLessEqual(dates[-1], timezone.now())
+
+
+class HttpBenchTests(TestCase):
+    def setUp(self):
+        call_command(
+            "seed_yatube", users=20, posts=50, comments=50, follows=30,
+            stdout=StringIO(),
+        )
+
+    def test_report_covers_all_views(self):
+        """Отчет содержит все сценарии, а записи бенчмарка удаляются"""
+        posts = Post.objects.count()
+        report = http_bench.run(
+            http_bench.reader(), ["client"], repeat=3, warmup=0
+        )
+        results = report["results"]["client"]
+        self.assertEqual(set(results), {
+            "index", "index_fragment", "group_posts", "profile",
+            "post_detail", "post_comments", "follow_index", "api_posts",
+            "api_group_posts", "api_profile_posts", "api_post_comments",
+            "api_follow", "create_post", "add_comment",
+        })
+        self.assertEqual(results["index"]["statuses"], [200])
+        self.assertEqual(results["create_post"]["statuses"], [302])
+        self.assertGreater(results["post_detail"]["queries"], 0)
+        self.assertGreater(results["index"]["bytes"], 0)
+        self.assertEqual(Post.objects.count(), posts)
+        self.assertFalse(
+            Comment.objects.filter(text__startswith=http_bench.MARK)
+        )
+
+    def test_compare_flags_query_regressions(self):
+        baseline = {"results": {"client": {"index": {
+            "p50_ms": 10, "p95_ms": 20, "p99_ms": 30,
+            "queries": 3, "bytes": 100,
+        }}}}
+        current = {"results": {"client": {"index": {
+            "p50_ms": 10.5, "p95_ms": 20, "p99_ms": 30,
+            "queries": 4, "bytes": 100,
+        }}}}
+        lines, regressed = http_bench.compare(baseline, current, 10)
+        self.assertTrue(regressed)
+        self.assertEqual(
+            [line for line in lines if line.endswith("!")],
+            [line for line in lines if "queries" in line],
+        )
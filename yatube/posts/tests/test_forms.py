@@ -1,13 +1,30 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Group, Post, User
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class PostFormTests(TestCase):
     """Создаем тестовую Базу Данных."""
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -91,3 +108,111 @@ class PostFormTests(TestCase):
         post.refresh_from_db()
         self.assertEqual(post.text, "Обновленный пост")
         self.assertEqual(post.group.id, group_2.id)
+
+
+class GroupChoicesTests(TestCase):
+    """Варианты группы в форме поста берутся из кеша"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.groups = [
+            Group.objects.create(title=f"Группа {number}", slug=f"g{number}")
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def group_queries(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            form = PostForm(**kwargs)
+            html = str(form["group"])
+        table = Group._meta.db_table
+        return html, [
+            query for query in queries if table in query["sql"]
+        ]
+
+    def test_choices_are_cached_and_versioned(self):
+        html, queries = self.group_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertIn("Группа 2", html)
+        html, queries = self.group_queries()
+        self.assertEqual(queries, [])
+        Group.objects.create(title="Новая группа", slug="new")
+        html, _ = self.group_queries()
+        self.assertIn("Новая группа", html)
+
+    @override_settings(GROUP_CHOICES_LIMIT=2)
+    def test_many_groups_switch_to_lookup(self):
+        selected = self.groups[2]
+        html, _ = self.group_queries(initial={"group": selected.pk})
+        self.assertIn(reverse("api:groups"), html)
+        self.assertIn(selected.title, html)
+        self.assertNotIn(self.groups[0].title, html)
+        form = PostForm(data={"text": "Пост", "group": self.groups[0].pk})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["group"], self.groups[0])
+        found = self.client.get(
+            reverse("api:groups"), {"q": "Группа 1", "fields": "id"}
+        ).json()
+        self.assertEqual(found["results"], [{"id": self.groups[1].pk}])
+
+    def test_lookup_ignores_case_of_non_ascii_titles(self):
+        cats = Group.objects.create(title="Котики", slug="cats")
+        Group.objects.create(title="Кошки", slug="kittens")
+        for query in ("кот", "КОТИ", "Котики"):
+            with self.subTest(query=query):
+                found = self.client.get(
+                    reverse("api:groups"), {"q": query, "fields": "id"}
+                ).json()
+                self.assertEqual(found["results"], [{"id": cats.pk}])
+        cats.title = "Собаки"
+        cats.save()
+        found = self.client.get(
+            reverse("api:groups"), {"q": "кот", "fields": "id"}
+        ).json()
+        self.assertEqual(found["results"], [])
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    POST_IMAGE_MAX_SIZE=(100, 100),
+)
+class PostImageNormalizationTests(TestCase):
+    """Картинка поста перекодируется при загрузке"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @staticmethod
+    def upload(name="photo.jpg", size=(400, 200)):
+        exif = Image.Exif()
+        exif[0x010F] = "Камера"
+        content = BytesIO()
+        Image.new("RGB", size, "green").save(content, "JPEG", exif=exif)
+        return SimpleUploadedFile(name, content.getvalue(), "image/jpeg")
+
+    def save_post(self, upload):
+        form = PostForm(data={"text": "Пост"}, files={"image": upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = User.objects.create_user(username=f"u{upload.name}")
+        post.save()
+        return post
+
+    def test_image_is_resized_and_stripped(self):
+        post = self.save_post(self.upload())
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.format, "JPEG")
+            self.assertFalse(image.getexif())
+
+    def test_identical_images_are_stored_once(self):
+        first = self.save_post(self.upload("first.jpg"))
+        second = self.save_post(self.upload("second.jpg"))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1
+        )
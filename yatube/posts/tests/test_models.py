@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import counters
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -92,3 +96,126 @@ class GroupModelTest(TestCase):
                 self.assertEqual(
                     group._meta.get_field(field).verbose_name, expected_value
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.other_group = Group.objects.create(title="Другая", slug="other")
+
+    def stats(self, user):
+        return AuthorStats.of(User.objects.get(pk=user.pk))
+
+    def test_post_counters(self):
+        """Счетчики постов следят за созданием, сменой группы и удалением"""
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.other_group.posts_count, 0)
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Счетчики комментариев и подписок"""
+        post = Post.objects.create(author=self.author, text="Пост")
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text="Комментарий"
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_save_keeps_concurrent_counters(self):
+        """save() устаревшего объекта не затирает сдвиги счетчиков"""
+        group = Group.objects.create(title="Своя", slug="own")
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=group
+        )
+        stale_group = Group.objects.get(pk=group.pk)
+        Comment.objects.create(post=post, author=self.reader, text="Да")
+        Post.objects.create(author=self.author, text="Еще", group=group)
+        post.text = "Новый текст"
+        post.save()
+        stale_group.description = "Описание"
+        stale_group.save()
+        post.refresh_from_db()
+        group.refresh_from_db()
+        self.assertEqual(post.text, "Новый текст")
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(group.description, "Описание")
+        self.assertEqual(group.posts_count, 2)
+
+    def test_deferred_relations_are_not_counted_as_moves(self):
+        """Пост из only() не сдвигает счетчики повторно"""
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        partial = Post.objects.only("text").get(pk=post.pk)
+        partial.text = "Правка"
+        partial.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        partial = Post.objects.only("text").get(pk=post.pk)
+        partial.group = self.other_group
+        partial.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_decrement_stops_at_zero(self):
+        """Уменьшение сверх значения счетчика дает ноль, а не пропуск"""
+        Group.objects.filter(pk=self.group.pk).update(posts_count=1)
+        counters.change_group_posts(self.group.pk, -2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_save_keeps_worker_flag_and_reinserts_deleted_row(self):
+        """save() не пишет thumbnails_ready и вставляет удаленную строку"""
+        post = Post.objects.create(author=self.author, text="Пост")
+        Post.objects.filter(pk=post.pk).update(thumbnails_ready=True)
+        post.thumbnails_ready = False
+        post.text = "Правка"
+        post.save()
+        self.assertTrue(Post.objects.get(pk=post.pk).thumbnails_ready)
+        Post.objects.filter(pk=post.pk).delete()
+        post.save()
+        self.assertTrue(Post.objects.filter(pk=post.pk).exists())
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет счетчики после bulk-операций"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text="Пост", group=self.group)
+            for _ in range(3)
+        )
+        Follow.objects.bulk_create((
+            Follow(user=self.reader, author=self.author),
+        ))
+        call_command("recount", stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+# Сессия и пользователь: перед каждым замером кеш очищается.
+AUTH_QUERIES = 2
+EXPECTED_QUERIES = {
+    # страница постов
+    "posts:index": AUTH_QUERIES + 1,
+    # id группы для ETag + группа + страница постов
+    "posts:group_list": AUTH_QUERIES + 3,
+    # id автора для ETag + автор со счетчиками + страница постов + подписка
+    "posts:profile": AUTH_QUERIES + 4,
+    # автор и группа для ETag + пост + комментарии с авторами
+    "posts:post_detail": AUTH_QUERIES + 3,
+    # автор и группа для ETag + id поста + порция комментариев
+    "posts:post_comments": AUTH_QUERIES + 3,
+    # лента подписок + подписки на «тяжелых» авторов + посты
+    "posts:follow_index": AUTH_QUERIES + 3,
+    # JSON API: те же чтения, что у HTML-страниц, но через .values()
+    "api:posts": AUTH_QUERIES + 1,
+    "api:group_posts": AUTH_QUERIES + 3,
+    "api:profile_posts": AUTH_QUERIES + 3,
+    "api:post_comments": AUTH_QUERIES + 3,
+    "api:follow": AUTH_QUERIES + 3,
+}
+
+
+class QueryCountTests(TestCase):
+    """Число запросов на страницу не зависит от числа постов и комментариев"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count, comments):
+        for number in range(count):
+            post = Post.objects.create(
+                author=self.author,
+                group=self.group,
+                text=f"Пост {number}",
+            )
+            for comment in range(comments):
+                Comment.objects.create(
+                    post=post,
+                    author=self.reader,
+                    text=f"Комментарий {comment}",
+                )
+        return post
+
+    def urls(self, post):
+        return {
+            "posts:index": reverse("posts:index"),
+            "posts:group_list": reverse(
+                "posts:group_list", args=(self.group.slug,)
+            ),
+            "posts:profile": reverse(
+                "posts:profile", args=(self.author.username,)
+            ),
+            "posts:post_detail": reverse(
+                "posts:post_detail", args=(post.pk,)
+            ),
+            "posts:post_comments": reverse(
+                "posts:post_comments", args=(post.pk,)
+            ),
+            "posts:follow_index": reverse("posts:follow_index"),
+            "api:posts": reverse("api:posts"),
+            "api:group_posts": reverse(
+                "api:group_posts", args=(self.group.slug,)
+            ),
+            "api:profile_posts": reverse(
+                "api:profile_posts", args=(self.author.username,)
+            ),
+            "api:post_comments": reverse(
+                "api:post_comments", args=(post.pk,)
+            ),
+            "api:follow": reverse("api:follow"),
+        }
+
+    def assert_query_counts(self, post):
+        for name, url in self.urls(post).items():
+            with self.subTest(name=name):
+                cache.clear()
+                with self.assertNumQueries(EXPECTED_QUERIES[name]):
+                    self.client.get(url)
+
+    def test_single_post(self):
+        self.assert_query_counts(self.add_posts(1, comments=1))
+
+    def test_many_posts_and_comments(self):
+        post = self.add_posts(
+            settings.COUNT_POSTS_ON_PAGE * 2, comments=3
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text="Еще комментарий")
+            for _ in range(20)
+        )
+        self.assert_query_counts(post)
@@ -1,20 +1,41 @@
+import datetime
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
+
 from django import forms
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
 
-from posts.forms import PostForm
+from posts import search, thumbnails, timeline
+from posts.forms import CommentForm, PostForm
 
-from ..models import Follow, Group, Post, User
+from ..models import (Comment, Follow, Group, Post, ThumbnailJob,
+                      TimelineEntry, User)
 
 ALL_TESTS_COUNT = settings.COUNT_POSTS_ON_PAGE * 2 - 1
 TEST_COUNT_SECOND_PAGE = ALL_TESTS_COUNT - settings.COUNT_POSTS_ON_PAGE
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class PostViewsTests(TestCase):
     """Создаем тестовую Базу Данных."""
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -226,11 +247,54 @@ class PostViewsTests(TestCase):
         """Тест кеширования главной страницы"""
         response = self.authorized_client.get(reverse("posts:index"))
         posts_1 = response.content
+        Post.objects.filter(pk=self.post.pk).update(text="Мимо сигналов")
+        response = self.authorized_client.get(reverse("posts:index"))
+        self.assertEqual(response.content, posts_1)
         Post.objects.create(author=self.user, text="Тест кеширования")
-        self.assertTrue(Post.objects.filter(text="Тест кеширования").exists())
         response = self.authorized_client.get(reverse("posts:index"))
-        posts_2 = response.content
-        self.assertEqual(posts_2, posts_1)
+        self.assertContains(response, "Тест кеширования")
+        # Карточка старого поста по-прежнему берется из кеша карточек.
+        self.assertNotContains(response, "Мимо сигналов")
+
+    def test_feed_cache_invalidation(self):
+        """Изменения постов, комментариев и групп сбрасывают кеш лент"""
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.user.username,)),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = "Отредактированный пост"
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), "Отредактированный пост"
+                )
+        Comment.objects.create(
+            post=self.post, author=self.user_1, text="Комментарий"
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), "Комментариев: 1"
+                )
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = "Новое название"
+        group.save()
+        self.assertContains(
+            self.guest_client.get(urls[0]), "Новое название"
+        )
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = "Переименованный"
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), "Переименованный"
+                )
 
     def test_correct_following_authors(self):
         """Добавление и удаление подписки"""
@@ -259,12 +323,9 @@ class PostViewsTests(TestCase):
             text="Новый пост",
         )
         Post.objects.create(author=new_author_2, text="Новый Пост2")
-        obj = [
-            Follow(user=self.user, author=self.new_author),
-            Follow(user=self.user, author=new_author_2),
-            Follow(user=new_user, author=self.new_author),
-        ]
-        Follow.objects.bulk_create(obj)
+        Follow.objects.create(user=self.user, author=self.new_author)
+        Follow.objects.create(user=self.user, author=new_author_2)
+        Follow.objects.create(user=new_user, author=self.new_author)
         response_first = self.authorized_client.get(
             reverse("posts:follow_index")
         )
@@ -308,19 +369,480 @@ class PaginatorViewsTest(TestCase):
             ("posts:group_list", (self.group.slug,)),
             ("posts:profile", (self.author.username,)),
         )
-        object_list = (
-            ("?page=1", settings.COUNT_POSTS_ON_PAGE),
-            ("?page=2", TEST_COUNT_SECOND_PAGE),
-        )
         for reverse_value, args in reverse_values:
-            with self.subTest():
-                for page, number in object_list:
-                    with self.subTest():
-                        reverse_name = reverse(reverse_value, args=args)
-                        response = self.authorized_client.get(
-                            reverse_name + page
-                        )
-                        self.assertEqual(len(
-                            response.context["page_obj"]),
-                            number,
-                        )
+            with self.subTest(reverse_value=reverse_value):
+                reverse_name = reverse(reverse_value, args=args)
+                response = self.authorized_client.get(reverse_name)
+                first_page = response.context["page_obj"]
+                self.assertEqual(
+                    len(first_page),
+                    settings.COUNT_POSTS_ON_PAGE,
+                )
+                self.assertIsNone(first_page.previous_cursor)
+                response = self.authorized_client.get(
+                    reverse_name, {"cursor": first_page.next_cursor}
+                )
+                second_page = response.context["page_obj"]
+                self.assertEqual(len(second_page), TEST_COUNT_SECOND_PAGE)
+                self.assertIsNone(second_page.next_cursor)
+                self.assertFalse(set(first_page) & set(second_page))
+                response = self.authorized_client.get(
+                    reverse_name, {"cursor": second_page.previous_cursor}
+                )
+                self.assertEqual(
+                    list(response.context["page_obj"]),
+                    list(first_page),
+                )
+
+    @override_settings(COMMENTS_PER_PAGE=3)
+    def test_comments_paginated_with_fragment(self):
+        """Комментарии отдаются порциями, следующая - HTML-фрагментом"""
+        post = Post.objects.create(author=self.author, text="Тестовый текст")
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text=f"Коммент {number}")
+            for number in range(5)
+        )
+        response = self.guest_client.get(
+            reverse("posts:post_detail", args=(post.pk,))
+        )
+        first_page = response.context["comments"]
+        self.assertEqual(len(first_page), 3)
+        self.assertIsInstance(response.context["form"], CommentForm)
+        fragment = self.guest_client.get(
+            reverse("posts:post_comments", args=(post.pk,)),
+            {"cursor": first_page.next_cursor},
+        )
+        second_page = fragment.context["comments"]
+        self.assertEqual(len(second_page), 2)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertFalse(set(first_page) & set(second_page))
+        self.assertNotContains(fragment, "<html")
+        self.assertNotContains(fragment, "js-more-comments")
+
+    def test_paginator_broken_cursor_returns_first_page(self):
+        """Битый курсор отдает первую страницу"""
+        Post.objects.create(author=self.author, text="Тестовый текст")
+        response = self.authorized_client.get(
+            reverse("posts:index"), {"cursor": "not-a-cursor"}
+        )
+        self.assertEqual(len(response.context["page_obj"]), 1)
+
+    def test_paginator_does_not_count_rows(self):
+        """Страница курсорной пагинации не выполняет COUNT(*)"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f"Текст {number}")
+            for number in range(ALL_TESTS_COUNT)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse("posts:index"))
+        self.assertFalse(
+            [query for query in queries if "COUNT(" in query["sql"]
+             and '"posts_post"' in query["sql"]]
+        )
+
+
+class TimelineViewsTest(TestCase):
+    """Материализованная лента подписок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.star = User.objects.create_user(username="star")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self, **params):
+        response = self.client.get(reverse("posts:follow_index"), params)
+        return response.context["page_obj"]
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка добавляет старые посты автора, отписка убирает"""
+        post = Post.objects.create(author=self.author, text="Старый пост")
+        self.client.get(
+            reverse("posts:profile_follow", args=(self.author.username,))
+        )
+        self.assertEqual(list(self.feed()), [post])
+        new_post = Post.objects.create(author=self.author, text="Новый пост")
+        self.assertEqual(list(self.feed()), [new_post, post])
+        self.client.get(
+            reverse("posts:profile_unfollow", args=(self.author.username,))
+        )
+        self.assertFalse(self.feed())
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_pulled_authors_are_merged_on_read(self):
+        """Посты авторов без раскладки подмешиваются при чтении"""
+        Follow.objects.create(user=self.reader, author=self.star)
+        Post.objects.bulk_create(
+            Post(author=self.star, text=f"Пост {number}")
+            for number in range(ALL_TESTS_COUNT)
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        first_page = self.feed()
+        self.assertEqual(len(first_page), settings.COUNT_POSTS_ON_PAGE)
+        second_page = self.feed(cursor=first_page.next_cursor)
+        self.assertEqual(len(second_page), TEST_COUNT_SECOND_PAGE)
+        self.assertFalse(set(first_page) & set(second_page))
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_back_under_threshold_is_fanned_out(self):
+        """Посты периода без раскладки попадают в ленты после него"""
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.author, author=self.star)
+        post = Post.objects.create(author=self.star, text="Пост звезды")
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        Follow.objects.filter(user=self.author).delete()
+        self.assertEqual(list(self.feed()), [post])
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post)
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.author))
+
+    @mock.patch("posts.timeline.REBUILD_CHUNK", 1)
+    def test_rebuild_selected_users_in_chunks(self):
+        post = Post.objects.create(author=self.star, text="Пост")
+        Follow.objects.bulk_create((
+            Follow(user=self.reader, author=self.star),
+            Follow(user=self.author, author=self.star),
+        ))
+        timeline.rebuild([self.reader.pk, self.author.pk])
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list("user_id", "post_id")),
+            {(self.reader.pk, post.pk), (self.author.pk, post.pk)},
+        )
+
+    def test_rebuild_timelines(self):
+        """rebuild_timelines собирает ленты после bulk-загрузки подписок"""
+        post = Post.objects.create(author=self.author, text="Пост")
+        Follow.objects.bulk_create(
+            (Follow(user=self.reader, author=self.author),)
+        )
+        self.assertFalse(self.feed())
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(list(self.feed()), [post])
+
+
+class ConditionalGetTest(TestCase):
+    """Повторный запрос с If-None-Match получает 304 до рендера"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.post = Post.objects.create(
+            author=cls.user, text="Пост", group=cls.group
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.user.username,)),
+            reverse("posts:post_detail", args=(self.post.pk,)),
+        )
+
+    def revalidate(self, url):
+        etag = self.client.get(url)["ETag"]
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                _, response = self.revalidate(url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertFalse(response.content)
+
+    def test_changes_reset_etag(self):
+        etags = {url: self.revalidate(url)[0] for url in self.urls}
+        Comment.objects.create(post=self.post, author=self.reader, text="К")
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_viewer(self):
+        etag, _ = self.revalidate(self.urls[0])
+        self.client.force_login(self.user)
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_resets_profile_etag(self):
+        etag, _ = self.revalidate(self.urls[2])
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.client.get(self.urls[2], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class FeedFragmentTest(TestCase):
+    """Ленты отдают только карточки и курсор следующей порции"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="auth")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(ALL_TESTS_COUNT):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f"Пост {number}"
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.author.username,)),
+            reverse("posts:follow_index"),
+        )
+
+    def test_fragment_has_only_cards(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                page = self.client.get(url)
+                fragment = self.client.get(url, {"fragment": "1"})
+                self.assertNotContains(fragment, "<html")
+                self.assertNotContains(fragment, "pagination")
+                self.assertContains(fragment, f"Пост {ALL_TESTS_COUNT - 1}")
+                self.assertLess(len(fragment.content), len(page.content))
+                self.assertEqual(
+                    fragment["X-Next-Cursor"],
+                    page.context["page_obj"].next_cursor,
+                )
+                self.assertIn("X-Fragment", fragment["Vary"])
+
+    def test_header_selects_fragment_and_last_page(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url, HTTP_X_FRAGMENT="1")
+                self.assertNotContains(first, "<html")
+                last = self.client.get(
+                    url,
+                    {"cursor": first["X-Next-Cursor"]},
+                    HTTP_X_FRAGMENT="1",
+                )
+                self.assertEqual(
+                    len(last.context["page_obj"]), TEST_COUNT_SECOND_PAGE
+                )
+                self.assertEqual(last["X-Next-Cursor"], "")
+
+    def test_fragment_and_page_have_different_etags(self):
+        page = self.client.get(self.urls[0])
+        response = self.client.get(
+            self.urls[0], HTTP_X_FRAGMENT="1", HTTP_IF_NONE_MATCH=page["ETag"]
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_QUEUE=True)
+class ThumbnailQueueTest(TestCase):
+    """Миниатюры готовятся очередью, до этого показывается заглушка"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @staticmethod
+    def upload(name):
+        image = BytesIO()
+        PILImage.new("RGB", (40, 30), "red").save(image, "PNG")
+        return SimpleUploadedFile(name, image.getvalue())
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="auth")
+        self.post = Post.objects.create(
+            author=self.user,
+            text="Пост с картинкой",
+            image=self.upload("red.png"),
+        )
+        self.url = reverse("posts:post_detail", args=(self.post.pk,))
+
+    def test_queue_prepares_thumbnails(self):
+        job = ThumbnailJob.objects.get(post=self.post)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        self.assertContains(self.client.get(self.url), "обрабатывается")
+        for job_id in thumbnails.claim(10):
+            self.assertEqual(thumbnails.process(job_id), ThumbnailJob.DONE)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnails_ready)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, "обрабатывается")
+        self.assertContains(response, '<img class="card-img')
+
+    def test_new_image_requeues(self):
+        ThumbnailJob.objects.update(status=ThumbnailJob.DONE)
+        Post.objects.filter(pk=self.post.pk).update(thumbnails_ready=True)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = "Только текст"
+        post.save()
+        self.assertFalse(
+            ThumbnailJob.objects.filter(status=ThumbnailJob.PENDING)
+        )
+        post.image = self.upload("new.png")
+        post.save()
+        self.assertFalse(post.thumbnails_ready)
+        self.assertTrue(
+            ThumbnailJob.objects.filter(status=ThumbnailJob.PENDING)
+        )
+
+    @override_settings(THUMBNAIL_MAX_ATTEMPTS=1)
+    def test_final_failure_drops_placeholder(self):
+        with mock.patch.object(
+            thumbnails, "generate", side_effect=OSError("битый файл")
+        ):
+            for job_id in thumbnails.claim(10):
+                self.assertEqual(
+                    thumbnails.process(job_id), ThumbnailJob.FAILED
+                )
+        response = self.client.get(self.url)
+        self.assertNotContains(response, "обрабатывается")
+        self.assertContains(response, '<img class="card-img')
+
+    def test_stale_running_job_is_reclaimed(self):
+        job_id, = thumbnails.claim(10)
+        self.assertEqual(thumbnails.claim(10), [])
+        ThumbnailJob.objects.filter(pk=job_id).update(
+            started=timezone.now() - datetime.timedelta(
+                seconds=settings.THUMBNAIL_JOB_TIMEOUT + 1
+            )
+        )
+        self.assertEqual(thumbnails.claim(10), [job_id])
+        job = ThumbnailJob.objects.get(pk=job_id)
+        self.assertEqual(job.attempts, 2)
+        ThumbnailJob.objects.filter(pk=job_id).update(
+            started=timezone.now() - datetime.timedelta(days=1),
+            attempts=settings.THUMBNAIL_MAX_ATTEMPTS,
+        )
+        self.assertEqual(thumbnails.claim(10), [])
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnails_ready)
+        self.assertEqual(
+            ThumbnailJob.objects.get(pk=job_id).status, ThumbnailJob.FAILED
+        )
+
+    def test_post_deleted_after_claim(self):
+        job_id, = thumbnails.claim(10)
+        self.post.delete()
+        self.assertIsNone(thumbnails.process(job_id))
+        self.assertEqual(thumbnails.run(1, 10, 0, once=True), 0)
+
+    def test_job_deleted_while_processing(self):
+        job_id, = thumbnails.claim(10)
+
+        def delete_post(post):
+            Post.objects.filter(pk=post.pk).delete()
+
+        with mock.patch.object(thumbnails, "generate", delete_post):
+            self.assertEqual(thumbnails.process(job_id), ThumbnailJob.DONE)
+        self.assertFalse(ThumbnailJob.objects.filter(pk=job_id))
+
+    @override_settings(THUMBNAIL_QUEUE=False)
+    def test_without_queue_template_renders_thumbnail(self):
+        post = Post.objects.create(
+            author=self.user,
+            text="Без воркера",
+            image=self.upload("lazy.png"),
+        )
+        self.assertTrue(post.thumbnails_ready)
+        self.assertFalse(ThumbnailJob.objects.filter(post=post))
+        response = self.client.get(
+            reverse("posts:post_detail", args=(post.pk,))
+        )
+        self.assertContains(response, '<img class="card-img')
+
+
+class SearchViewsTest(TestCase):
+    """Поиск по индексу FTS5 следует за изменениями постов и комментариев"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.post = Post.objects.create(
+            author=cls.author, text="Рассвет над <морем> и чайки"
+        )
+        cls.other = Post.objects.create(
+            author=cls.author, text="Закат в горах"
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.other, author=cls.author, text="Какое море!"
+        )
+        cls.url = reverse("posts:search")
+
+    def search(self, query, **params):
+        return self.client.get(self.url, {"q": query, **params})
+
+    def test_finds_posts_and_comments(self):
+        hits = self.search("МОРЕ").context["hits"]
+        self.assertEqual(
+            {(hit.kind, hit.obj.pk) for hit in hits},
+            {(search.POST, self.post.pk), (search.COMMENT, self.comment.pk)},
+        )
+        self.assertEqual(
+            {hit.post.pk for hit in hits}, {self.post.pk, self.other.pk}
+        )
+
+    def test_snippet_is_escaped(self):
+        response = self.search("морем")
+        self.assertContains(response, "&lt;<mark>морем</mark>&gt;")
+
+    def test_index_follows_changes(self):
+        self.post.text = "Только чайки"
+        self.post.save()
+        self.assertEqual(
+            [hit.obj for hit in self.search("рассвет").context["hits"]], []
+        )
+        self.other.delete()
+        self.assertEqual(self.search("море").context["hits"], [])
+        self.assertEqual(len(self.search("чайки").context["hits"]), 1)
+
+    def test_syntax_is_not_passed_to_fts(self):
+        for query in ('"', "море AND OR", "NEAR(", "*", ""):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    self.search(query).status_code, HTTPStatus.OK
+                )
+
+    def test_keyset_pagination(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f"Волна номер {number}")
+            for number in range(settings.COUNT_POSTS_ON_PAGE + 3)
+        )
+        call_command("rebuild_search", stdout=StringIO())
+        first = self.search("волна")
+        cursor = first.context["next_cursor"]
+        self.assertIsNotNone(cursor)
+        second = self.search("волна", cursor=cursor)
+        self.assertIsNone(second.context["next_cursor"])
+        ids = [
+            hit.obj.pk
+            for page in (first, second)
+            for hit in page.context["hits"]
+        ]
+        self.assertEqual(len(ids), settings.COUNT_POSTS_ON_PAGE + 3)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "мор"}
+        )
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.post]
+        )
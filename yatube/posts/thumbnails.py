@@ -0,0 +1,156 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+При сохранении поста с новой картинкой в таблицу ThumbnailJob
+ставится задание, а шаблоны до его выполнения показывают заглушку.
+Команда thumbnail_worker разбирает очередь пулом потоков и заранее
+создает все миниатюры, которые запрашивают шаблоны, поэтому запрос,
+впервые показавший пост, больше не ждет Pillow. Очередь работает
+только с THUMBNAIL_QUEUE. Задание, исчерпавшее попытки, все равно
+помечает пост готовым: шаблон тогда пробует создать миниатюру сам
+и показывает исходную картинку, если не получилось. Задание упавшего
+воркера через THUMBNAIL_JOB_TIMEOUT снова попадает в очередь.
+"""
+import datetime
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+from sorl.thumbnail import delete, get_thumbnail
+
+from . import card_cache, feed_cache
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+# Должны совпадать с тегом {% thumbnail %} в includes/post_image.html.
+GEOMETRIES = (
+    ("960x339", {"crop": "center", "upscale": True}),
+)
+
+
+def enqueue(post):
+    """Ставит пост в очередь, если для него еще нет ожидающего задания."""
+    ThumbnailJob.objects.get_or_create(
+        post_id=post.pk, status=ThumbnailJob.PENDING
+    )
+
+
+def reclaim_stale():
+    """Возвращает в очередь задания, брошенные упавшим воркером."""
+    deadline = timezone.now() - datetime.timedelta(
+        seconds=settings.THUMBNAIL_JOB_TIMEOUT
+    )
+    stale = ThumbnailJob.objects.filter(
+        status=ThumbnailJob.RUNNING, started__lt=deadline
+    )
+    exhausted = stale.filter(
+        attempts__gte=settings.THUMBNAIL_MAX_ATTEMPTS
+    ).select_related("post")
+    for job in exhausted:
+        if ThumbnailJob.objects.filter(
+            pk=job.pk, status=ThumbnailJob.RUNNING
+        ).update(
+            status=ThumbnailJob.FAILED,
+            error="Воркер не завершил задание",
+        ):
+            _mark_ready(job.post)
+    return stale.update(status=ThumbnailJob.PENDING)
+
+
+def claim(limit):
+    """Забирает до limit заданий так, чтобы их не взял другой воркер."""
+    reclaim_stale()
+    pending = ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PENDING
+    ).values_list("pk", flat=True)[:limit]
+    return [
+        pk for pk in pending
+        if ThumbnailJob.objects.filter(
+            pk=pk, status=ThumbnailJob.PENDING
+        ).update(
+            status=ThumbnailJob.RUNNING,
+            attempts=F("attempts") + 1,
+            started=timezone.now(),
+        )
+    ]
+
+
+def generate(post):
+    for geometry, options in GEOMETRIES:
+        get_thumbnail(post.image, geometry, **options)
+
+
+def forget(names):
+    """Удаляет миниатюры и записи sorl о картинках удаленных постов.
+
+    Сами картинки остаются, как и при обычном удалении модели.
+    """
+    for name in names:
+        delete(name, delete_file=False)
+
+
+def _mark_ready(post):
+    Post.objects.filter(pk=post.pk).update(thumbnails_ready=True)
+    card_cache.invalidate_post(post.pk)
+    feed_cache.bump(*feed_cache.post_feeds(post.author_id, post.group_id))
+
+
+def process(job_id):
+    """Выполняет одно задание; ошибки возвращают его в очередь.
+
+    Пост могут удалить вместе с заданием уже после claim(): тогда
+    делать нечего, и функция возвращает None.
+    """
+    job = ThumbnailJob.objects.select_related("post").filter(
+        pk=job_id
+    ).first()
+    if job is None:
+        return None
+    try:
+        if job.post.image:
+            generate(job.post)
+        _mark_ready(job.post)
+    except Exception as error:
+        logger.exception("Не удалось подготовить миниатюры %s", job)
+        failed = job.attempts >= settings.THUMBNAIL_MAX_ATTEMPTS
+        job.status = ThumbnailJob.FAILED if failed else ThumbnailJob.PENDING
+        job.error = str(error)
+        if failed:
+            # Заглушка не должна остаться навсегда: дальше картинкой
+            # занимается шаблон.
+            _mark_ready(job.post)
+    else:
+        job.status = ThumbnailJob.DONE
+        job.error = ""
+    # update(), а не save(): строку могли удалить, пока шла работа.
+    ThumbnailJob.objects.filter(pk=job.pk).update(
+        status=job.status, error=job.error
+    )
+    return job.status
+
+
+def _process_in_thread(job_id):
+    try:
+        return process(job_id)
+    finally:
+        # У каждого потока свое соединение с БД.
+        connection.close()
+
+
+def run(threads, batch_size, poll_interval, once=False):
+    """Разбирает очередь пулом потоков; с once=True - пока она не пуста."""
+    processed = 0
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        while True:
+            close_old_connections()
+            jobs = claim(batch_size)
+            if jobs:
+                processed += len(list(pool.map(_process_in_thread, jobs)))
+            elif once:
+                return processed
+            else:
+                time.sleep(poll_interval)
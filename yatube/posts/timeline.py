@@ -0,0 +1,217 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+чтение /follow/ - это диапазонное чтение TimelineEntry по индексу
+(user, -pub_date, -post). Для авторов с очень большим числом
+подписчиков раскладка слишком дорогая: их посты подмешиваются
+при чтении (fan-out on read).
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginators import NEXT, CursorPaginator, decode_cursor
+
+
+def is_pulled(author_id):
+    """Посты автора не раскладываются, а читаются из его ленты."""
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def _entries(post, user_ids):
+    return (
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+    )
+
+
+def fan_out(post):
+    """Кладет новый пост в ленты всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user_id", flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(post, follower_ids),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        "id", "author_id", "pub_date"
+    )[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        (entry for post in posts for entry in _entries(post, (user_id,))),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+RESTORE_SQL = """
+    INSERT OR IGNORE INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT follow.user_id, post.id, post.author_id, post.pub_date
+    FROM {follow} follow
+    JOIN (
+        SELECT id, author_id, pub_date FROM {post}
+        WHERE author_id = %s
+        ORDER BY pub_date DESC, id DESC
+        LIMIT %s
+    ) post ON post.author_id = follow.author_id
+    WHERE follow.author_id = %s
+"""
+
+
+def restore_fan_out(author_id):
+    """Раскладывает посты автора, который опустился до порога раскладки.
+
+    Пока подписчиков было больше TIMELINE_FANOUT_MAX_FOLLOWERS, посты
+    читались из ленты автора и в TimelineEntry не попадали; без этого
+    они пропали бы из /follow/, как только их перестанут подмешивать.
+    Вызывается после уменьшения счетчика в той же транзакции, поэтому
+    переход через порог виден ровно один раз.
+    """
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    if not AuthorStats.objects.filter(
+        user_id=author_id, followers_count=limit
+    ).exists():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(RESTORE_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            follow=Follow._meta.db_table,
+            post=Post._meta.db_table,
+        ), [author_id, settings.TIMELINE_BACKFILL, author_id])
+
+
+def remove(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+REBUILD_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT DISTINCT follow.user_id, post.id, post.author_id, post.pub_date
+    FROM {follow} follow
+    JOIN (
+        SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+            PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+        ) AS position
+        FROM {post}
+    ) post ON post.author_id = follow.author_id
+    WHERE post.position <= %s AND follow.author_id NOT IN (
+        SELECT user_id FROM {stats} WHERE followers_count > %s
+    ){users}
+    ORDER BY follow.user_id, post.pub_date DESC, post.id DESC
+"""
+
+
+# Пользователей в одном IN (...) при частичной пересборке: SQLite
+# ограничивает число параметров запроса.
+REBUILD_CHUNK = 500
+
+
+def rebuild(user_ids=None):
+    """Собирает ленты заново из подписок, например после bulk_create.
+
+    Все ленты собираются одним INSERT ... SELECT: каждому подписчику
+    достаются последние TIMELINE_BACKFILL постов каждого автора. Строки
+    вставляются в порядке индекса ленты, так его дешевле строить.
+    Ленты выбранных пользователей пересобираются по REBUILD_CHUNK.
+    """
+    if user_ids is None:
+        TimelineEntry.objects.all().delete()
+        _insert_timelines("", [])
+        return
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), REBUILD_CHUNK):
+        chunk = user_ids[start:start + REBUILD_CHUNK]
+        TimelineEntry.objects.filter(user_id__in=chunk).delete()
+        _insert_timelines(
+            " AND follow.user_id IN ({})".format(
+                ", ".join(["%s"] * len(chunk))
+            ),
+            chunk,
+        )
+
+
+def _insert_timelines(users, user_params):
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            follow=Follow._meta.db_table,
+            post=Post._meta.db_table,
+            stats=AuthorStats._meta.db_table,
+            users=users,
+        ), [
+            settings.TIMELINE_BACKFILL,
+            settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+            *user_params,
+        ])
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорная пагинация ленты подписок поверх TimelineEntry.
+
+    Страница собирается слиянием двух диапазонных чтений:
+    материализованной ленты и постов «тяжелых» авторов.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(
+            TimelineEntry.objects.filter(user=user).order_by(
+                "-pub_date", "-post_id"
+            ),
+            per_page,
+            pk_field="post_id",
+        )
+        self.user = user
+
+    def sources(self):
+        yield self.object_list
+        pulled = Follow.objects.filter(
+            user=self.user,
+            author__stats__followers_count__gt=(
+                settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+            ),
+        ).values_list("author_id", flat=True)
+        if pulled:
+            yield Post.objects.filter(author_id__in=pulled).annotate(
+                post_id=F("pk")
+            )
+
+    def page_keys(self, cursor=None):
+        """Пары (дата, id поста) страницы в порядке чтения."""
+        position = decode_cursor(cursor)
+        newest_first = position is None or position[0] == NEXT
+        keys = set()
+        for source in self.sources():
+            keys.update(
+                self.page_queryset(cursor, source).values_list(
+                    self.date_field, self.pk_field
+                )
+            )
+        return sorted(keys, reverse=newest_first)[:self.per_page + 1]
+
+    def page_rows(self, cursor=None):
+        keys = self.page_keys(cursor)
+        posts = Post.objects.select_related("author", "group").in_bulk(
+            [pk for _, pk in keys]
+        )
+        return [posts[pk] for _, pk in keys if pk in posts]
@@ -10,12 +10,18 @@ urlpatterns = [
     path("profile/<str:username>/", views.profile, name="profile"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
     path("create/", views.create_post, name="create_post"),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path(
         "posts/<int:post_id>/comment/",
         views.add_comment,
         name="add_comment",
     ),
+    path("search/", views.search_posts, name="search"),
     path("follow/", views.follow_index, name="follow_index"),
     path(
         "profile/<str:username>/follow/",
@@ -1,20 +1,41 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from core import routers
+from core.routers import replica_reads
+
+from . import feed_cache, fragments, search
+from .etags import (group_posts_etag, index_etag, post_detail_etag,
+                    profile_etag)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .paginators import CursorPaginator
+from .timeline import TimelinePaginator
 
 """Get page_obj"""
 
 
 def _page_obj(request, mod_obj):
-    paginator = Paginator(mod_obj, settings.COUNT_POSTS_ON_PAGE)
-    page_number = request.GET.get("page")
-    return paginator.get_page(page_number)
+    paginator = CursorPaginator(mod_obj, settings.COUNT_POSTS_ON_PAGE)
+    return paginator.get_page(request.GET.get("cursor"))
+
+
+def _feed_cache(page_obj, feed, *depends_on):
+    """Контекст для тега {% cache %} вокруг карточек ленты."""
+    return {
+        "feed_cache_key": feed_cache.page_key(
+            feed, page_obj.cursor, *depends_on
+        ),
+        "feed_cache_timeout": routers.cache_timeout(
+            settings.FEED_CACHE_TIMEOUT
+        ),
+    }
 
 
+@replica_reads
+@condition(etag_func=index_etag)
 def index(request):
     posts = Post.objects.select_related(
         "group",
@@ -23,31 +44,48 @@ def index(request):
     page_obj = _page_obj(request, posts)
     context = {
         "page_obj": page_obj,
+        **_feed_cache(
+            page_obj,
+            feed_cache.INDEX,
+            feed_cache.GROUPS,
+            feed_cache.AUTHORS,
+        ),
     }
     template = "posts/index.html"
-    return render(request, template, context)
+    return fragments.render_feed(request, template, context)
 
 
+@replica_reads
+@condition(etag_func=group_posts_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.select_related("author")
     page_obj = _page_obj(request, posts)
     context = {
         "group": group,
         "page_obj": page_obj,
+        **_feed_cache(
+            page_obj,
+            feed_cache.group_feed(group.pk),
+            feed_cache.AUTHORS,
+        ),
     }
     template = "posts/group_list.html"
-    return render(request, template, context)
+    return fragments.render_feed(request, template, context, index=False)
 
 
+@replica_reads
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related("stats"),
+        username=username,
+    )
     posts = author.posts.select_related("group")
-    post_count = posts.count()
+    post_count = AuthorStats.of(author).posts_count
     page_obj = _page_obj(request, posts)
-    following = False
-    following = Follow.objects.filter(
-        user=request.user.is_authenticated,
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user,
         author=author,
     ).exists()
     context = {
@@ -55,26 +93,58 @@ def profile(request, username):
         "author": author,
         "page_obj": page_obj,
         "following": following,
+        **_feed_cache(
+            page_obj,
+            feed_cache.profile_feed(author.pk),
+            feed_cache.GROUPS,
+            feed_cache.AUTHORS,
+        ),
     }
     template = "posts/profile.html"
-    return render(request, template, context)
+    return fragments.render_feed(request, template, context)
 
 
+@replica_reads
+@condition(etag_func=post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    count = post.author.posts.all().count()
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"),
+        id=post_id,
+    )
+    count = AuthorStats.of(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comment = Comment.objects.filter(post=post)
     context = {
         "post": post,
         "count": count,
         "form": form,
-        "comments": comment,
+        "comments": _comments_page(request, post.pk),
     }
     template = "posts/post_detail.html"
     return render(request, template, context)
 
 
+def _comments_page(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        "author"
+    )
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, date_field="created"
+    )
+    return paginator.get_page(request.GET.get("cursor"))
+
+
+@replica_reads
+@condition(etag_func=post_detail_etag)
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для подгрузки."""
+    post = get_object_or_404(Post.objects.only("pk"), id=post_id)
+    context = {
+        "post": post,
+        "comments": _comments_page(request, post.pk),
+    }
+    return render(request, "includes/comments.html", context)
+
+
 @login_required
 def create_post(request):
     form = PostForm(
@@ -129,14 +199,28 @@ def add_comment(request, post_id):
     return redirect("posts:post_detail", post_id=post_id)
 
 
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    hits, next_cursor = search.search(
+        query, request.GET.get("cursor"), settings.COUNT_POSTS_ON_PAGE
+    )
+    context = {
+        "query": query,
+        "hits": hits,
+        "next_cursor": next_cursor,
+    }
+    return render(request, "posts/search.html", context)
+
+
+@replica_reads
 @login_required
 def follow_index(request):
-    post = Post.objects.select_related("author").filter(
-        author__following__user=request.user
+    paginator = TimelinePaginator(
+        request.user, settings.COUNT_POSTS_ON_PAGE
     )
-    page_obj = _page_obj(request, post)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
     context = {"page_obj": page_obj}
-    return render(request, "posts/follow.html", context)
+    return fragments.render_feed(request, "posts/follow.html", context)
 
 
 @login_required
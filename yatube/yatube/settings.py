@@ -17,14 +17,68 @@ ALLOWED_HOSTS = [
 ]
 
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+# Кеш: YATUBE_CACHE=local - LocMemCache в памяти каждого процесса,
+# shared - общий для процессов файл SQLite, two_level - кеш процесса
+# с коротким TTL перед общим (core/caches.py). Вместо SHARED_CACHE
+# можно подставить memcached: TwoLevelCache берет L2 по алиасу.
+CACHE_MODE = os.environ.get("YATUBE_CACHE", "local")
+SHARED_CACHE = {
+    "BACKEND": "core.caches.SQLiteCache",
+    "LOCATION": os.path.join(BASE_DIR, "cache", "shared.sqlite3"),
+    "OPTIONS": {"MAX_ENTRIES": 200000},
 }
+CACHES = {
+    "local": {
+        "default": {
+            "BACKEND": "core.timing.LocMemCache",
+        },
+    },
+    "shared": {
+        "default": SHARED_CACHE,
+        "shared": SHARED_CACHE,
+    },
+    "two_level": {
+        "default": {
+            "BACKEND": "core.caches.TwoLevelCache",
+            "OPTIONS": {"L2": "shared", "L1_TIMEOUT": 2},
+        },
+        "shared": SHARED_CACHE,
+    },
+}[CACHE_MODE]
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
+# Алиас кеша, общего для всех процессов, или None, если его нет.
+# Только в таком кеше можно держать сессии и пользователей: сброс в
+# LocMemCache одного процесса не доходит до остальных.
+SHARED_CACHE_ALIAS = "shared" if "shared" in CACHES else None
+
+# Хранилище сессий: YATUBE_SESSION_MODE=db, cached_db, cache или
+# signed_cookies. cached_db читает сессию из кеша и только при промахе
+# из django_session, cache хранит ее только в кеше; оба годятся лишь
+# с общим кешем и по умолчанию включаются только при нем.
+# signed_cookies держит сессию в подписанной cookie.
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+SESSION_MODE = os.environ.get(
+    "YATUBE_SESSION_MODE", "cached_db" if SHARED_CACHE_ALIAS else "db"
+)
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+# Сессии читаются из общего кеша напрямую, минуя L1 TwoLevelCache:
+# иначе другой процесс мог бы еще L1_TIMEOUT секунд принимать
+# сессию после выхода из аккаунта.
+SESSION_CACHE_ALIAS = SHARED_CACHE_ALIAS or "default"
+
+# Пользователь сессии читается из общего кеша (core/auth.py); без
+# общего кеша или с AUTH_USER_CACHE_TIMEOUT = 0 - из auth_user.
+AUTHENTICATION_BACKENDS = ["core.auth.CachedModelBackend"]
+AUTH_USER_CACHE_ALIAS = SHARED_CACHE_ALIAS
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+
 INSTALLED_APPS = [
     "django.contrib.admin",
     "django.contrib.auth",
@@ -44,11 +98,13 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
+    "core.middleware.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.auth.SessionCookieAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -58,7 +114,7 @@ ROOT_URLCONF = "yatube.urls"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.timing.TimedDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -82,9 +138,40 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # Соединение переживает запрос: прагмы не применяются заново.
+        "CONN_MAX_AGE": 600,
     }
 }
 
+# Реплики для чтения лент: YATUBE_REPLICAS=2 добавляет алиасы replica1
+# и replica2 - копии db.sqlite3, которые обновляет manage.py
+# sync_replicas. После записи пользователь REPLICA_PIN_SECONDS секунд
+# читает основную базу (core/routers.py).
+DATABASE_REPLICAS = [
+    f"replica{number}"
+    for number in range(1, int(os.environ.get("YATUBE_REPLICAS", 0)) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": os.path.join(BASE_DIR, f"db.{alias}.sqlite3"),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_PIN_COOKIE = "pin_primary"
+REPLICA_PIN_SECONDS = 10
+
+# Прагмы каждого нового соединения SQLite (core/sqlite.py).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ, а не в страницах.
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -122,4 +209,111 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 COUNT_POSTS_ON_PAGE = 10
+COMMENTS_PER_PAGE = 20
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Больше GROUP_CHOICES_LIMIT групп форма поста не выводит списком,
+# а ищет через api:groups.
+GROUP_CHOICES_LIMIT = 200
+GROUP_CHOICES_CACHE_TIMEOUT = 60 * 60 * 24
+# Посты авторов, у которых подписчиков больше порога, не раскладываются
+# по лентам при публикации, а подмешиваются в /follow/ при чтении.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+TIMELINE_BACKFILL = 200
+TIMELINE_BATCH_SIZE = 500
+
+# Загруженные картинки постов перекодируются в POST_IMAGE_FORMAT
+# с ограничением размера; WebP-копия сохраняется рядом, если Pillow
+# собран с libwebp.
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_FORMAT = "JPEG"
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_WEBP_COPY = False
+
+# С YATUBE_THUMBNAIL_QUEUE=1 миниатюры заранее готовит
+# thumbnail_worker, а до того показывается заглушка. Без воркера
+# (по умолчанию) шаблон создает миниатюру при первом показе.
+THUMBNAIL_QUEUE = os.environ.get("YATUBE_THUMBNAIL_QUEUE") == "1"
+THUMBNAIL_WORKER_THREADS = 4
+THUMBNAIL_MAX_ATTEMPTS = 3
+# Задание, которое выполняется дольше, считается брошенным упавшим
+# воркером и снова попадает в очередь.
+THUMBNAIL_JOB_TIMEOUT = 10 * 60
+
+# Массовые действия админки (posts.bulk): строк в одной транзакции
+# и пауза между пачками, чтобы не держать запись SQLite подолгу.
+BULK_JOB_BATCH_SIZE = 500
+BULK_JOB_PAUSE = 0.05
+# Выполняемое задание без новой пачки дольше этого срока считается
+# брошенным упавшим воркером и продолжается другим.
+BULK_JOB_TIMEOUT = 5 * 60
 EMPTY_VALUE = "-пусто-"
+# Выше этого числа строк changelist админки не делает точный COUNT(*).
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# ServerTimingMiddleware: заголовок Server-Timing раскрывает устройство
+# сайта, поэтому по умолчанию он только в DEBUG. Запросы сверх порогов
+# пишутся в лог yatube.requests с уровнем WARNING.
+SERVER_TIMING_HEADER = DEBUG
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_QUERIES = 30
+SLOW_REQUEST_DB_MS = 200
+
+# Режим сбора статистики SQL по отпечаткам (manage.py querystats).
+# Агрегаты пишутся в QUERYSTATS_FILE раз в QUERYSTATS_FLUSH_REQUESTS
+# запросов или QUERYSTATS_FLUSH_SECONDS секунд.
+QUERYSTATS_ENABLED = False
+QUERYSTATS_FILE = os.path.join(BASE_DIR, "logs", "querystats.jsonl")
+QUERYSTATS_FLUSH_REQUESTS = 100
+QUERYSTATS_FLUSH_SECONDS = 60
+
+# Журнал запросов yatube.requests: с YATUBE_REQUEST_LOG=путь строка
+# JSON о каждом запросе пишется в этот файл (уровень INFO), без него -
+# в консоль только запросы сверх порогов (WARNING). Уровень можно
+# задать явно через YATUBE_REQUEST_LOG_LEVEL.
+REQUEST_LOG_FILE = os.environ.get("YATUBE_REQUEST_LOG")
+REQUEST_LOG_LEVEL = os.environ.get(
+    "YATUBE_REQUEST_LOG_LEVEL", "INFO" if REQUEST_LOG_FILE else "WARNING"
+)
+# Тесты (manage.py test) подменяют обработчик журнала запросов.
+TEST_RUNNER = "core.test_runner.QuietRequestLogRunner"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "requests": (
+            {
+                "class": "core.querystats.RotatingFileHandler",
+                "filename": REQUEST_LOG_FILE,
+                "maxBytes": 10 * 1024 * 1024,
+                "backupCount": 5,
+                "delay": True,
+            }
+            if REQUEST_LOG_FILE
+            else {"class": "logging.StreamHandler"}
+        ),
+        "querystats": {
+            "class": "core.querystats.RotatingFileHandler",
+            "filename": QUERYSTATS_FILE,
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "delay": True,
+        },
+    },
+    "loggers": {
+        "yatube.requests": {
+            "handlers": ["requests"],
+            "level": REQUEST_LOG_LEVEL,
+            "propagate": False,
+        },
+        "yatube.querystats": {
+            "handlers": ["querystats"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}